@@ -0,0 +1,128 @@
+"""Сравнение преобразования персон и фильмов с прежней реализацией.
+
+Запуск из каталога etl:
+
+    python -m benchmarks.transform [--persons 50] [--films 500] [--movies 2000] [--repeat 3]
+"""
+import argparse
+import copy
+import random
+import timeit
+import uuid
+from dataclasses import asdict, dataclass, field
+
+from dataclasses_storage import FilmWork, Person, ROLES, to_document
+
+
+@dataclass
+class LegacyFilmWork:
+    """Прежний FilmWork: отдельная ветка на каждую роль."""
+    id: uuid.UUID
+    title: str
+    description: str
+    imdb_rating: float
+    persons: list[dict]
+    genres: list[str]
+    actors_names: list = field(init=False)
+    writers_names: list = field(init=False)
+    directors_names: list = field(init=False)
+    actors: list = field(init=False)
+    writers: list = field(init=False)
+    directors: list = field(init=False)
+
+    def __post_init__(self):
+        self.actors_names, self.actors = [], []
+        self.writers_names, self.writers = [], []
+        self.directors_names, self.directors = [], []
+        for person in self.persons:
+            if person["person_role"] == "actor":
+                self.actors_names.append(person["person_name"])
+                self.actors.append({"id": person["person_id"], "name": person["person_name"]})
+            elif person["person_role"] == "writer":
+                self.writers_names.append(person["person_name"])
+                self.writers.append({"id": person["person_id"], "name": person["person_name"]})
+            elif person["person_role"] == "director":
+                self.directors_names.append(person["person_name"])
+                self.directors.append({"id": person["person_id"], "name": person["person_name"]})
+
+
+@dataclass
+class LegacyPerson:
+    """Прежний Person: поиск фильма перебором уже собранных."""
+    id: uuid.UUID
+    full_name: str
+    films: list
+
+    def __post_init__(self):
+        unique_films = []
+        for film in self.films:
+            if any(x['filmwork_id'] == film['filmwork_id'] for x in unique_films):
+                for unique_film in unique_films:
+                    if film['filmwork_id'] == unique_film['filmwork_id'] and film['roles'] not in unique_film['roles']:
+                        unique_film['roles'].append(film['roles'])
+            else:
+                film['roles'] = [film['roles']]
+                unique_films.append(film)
+        self.films = unique_films
+
+
+def person_rows(persons: int, films: int) -> list[tuple]:
+    """Строки ALL_MODIFIED_PERSONS: по элементу films на каждую роль персоны в фильме."""
+    rows = []
+    for _ in range(persons):
+        credits = []
+        for _ in range(films):
+            film_id = str(uuid.uuid4())
+            for role in random.sample(list(ROLES), random.randint(1, 3)):
+                credits.append({'filmwork_id': film_id, 'roles': role, 'title': 'film', 'imdb_rating': 7.5})
+        random.shuffle(credits)
+        rows.append((str(uuid.uuid4()), 'person', credits))
+    return rows
+
+
+def movie_rows(movies: int, persons: int) -> list[tuple]:
+    rows = []
+    for _ in range(movies):
+        people = [{'person_role': random.choice(list(ROLES)), 'person_id': str(uuid.uuid4()),
+                   'person_name': 'person'} for _ in range(persons)]
+        rows.append((str(uuid.uuid4()), 'film', '', 7.5, people, ['Drama']))
+    return rows
+
+
+def measure(name: str, func, rows: list, repeat: int) -> float:
+    # Прежняя реализация меняет входные словари, поэтому каждый прогон - на своей копии
+    copies = [copy.deepcopy(rows) for _ in range(repeat)]
+    elapsed = min(timeit.repeat(lambda: func(copies.pop()), number=1, repeat=repeat))
+    print(f'{name:<40}{elapsed * 1e3:>12.1f}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--persons', type=int, default=50, help='персон в пачке')
+    parser.add_argument('--films', type=int, default=500, help='фильмов у каждой персоны')
+    parser.add_argument('--movies', type=int, default=2000, help='фильмов в пачке')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    persons = person_rows(args.persons, args.films)
+    print(f'\n{args.persons} persons x {args.films} films')
+    print(f'{"implementation":<40}{"ms":>12}')
+    before = measure('legacy Person + asdict', lambda rows: [asdict(LegacyPerson(*row)) for row in rows],
+                     persons, args.repeat)
+    after = measure('Person + to_document', lambda rows: [to_document(Person(*row)) for row in rows],
+                    persons, args.repeat)
+    print(f'speedup: {before / after:.1f}x')
+
+    movies = movie_rows(args.movies, 30)
+    print(f'\n{args.movies} movies x 30 persons')
+    print(f'{"implementation":<40}{"ms":>12}')
+    before = measure('legacy FilmWork + asdict', lambda rows: [asdict(LegacyFilmWork(*row)) for row in rows],
+                     movies, args.repeat)
+    after = measure('FilmWork + to_document', lambda rows: [to_document(FilmWork(*row)) for row in rows],
+                    movies, args.repeat)
+    print(f'speedup: {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ChangeSet:
+    """Изменения одного или нескольких проходов: id по таймерам и позиции после них."""
+    positions: dict[str, list]
+    ids: dict[str, frozenset]
+
+    def merge(self, newer: 'ChangeSet') -> 'ChangeSet':
+        return ChangeSet(
+            positions={**self.positions, **newer.positions},
+            ids={key: self.ids.get(key, frozenset()) | newer.ids.get(key, frozenset())
+                 for key in self.ids.keys() | newer.ids.keys()},
+        )
+
+
+class ChangeFeed:
+    """Общий поток изменений для нескольких индексов.
+
+    Изменения определяются один раз и раздаются всем подписчикам. Публикация
+    никогда не ждёт: если индекс не успел забрать прошлые изменения, новые
+    сливаются с ними, и отстающий индекс просто получит одну пачку побольше,
+    не задерживая остальные.
+    """
+
+    def __init__(self, names: list[str]):
+        self._pending: dict[str, ChangeSet | None] = dict.fromkeys(names)
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def publish(self, changes: ChangeSet):
+        with self._condition:
+            for name, pending in self._pending.items():
+                self._pending[name] = pending.merge(changes) if pending else changes
+            self._condition.notify_all()
+
+    def take(self, name: str) -> ChangeSet | None:
+        """Дождаться изменений для индекса; None - поток закрыт."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or self._pending[name] is not None)
+            if self._closed:
+                return None
+            changes, self._pending[name] = self._pending[name], None
+            return changes
+
+    def lag(self, name: str) -> int:
+        """Сколько id ждёт индекс."""
+        with self._condition:
+            pending = self._pending[name]
+            return sum(len(ids) for ids in pending.ids.values()) if pending else 0
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
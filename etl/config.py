@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,12 +11,58 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = '5432'
     ELASTIC_PORT: str = '9200'
     ELASTIC_HOST: str = 'localhost'
+    REDIS_HOST: str = 'localhost'
+    REDIS_PORT: int = 6379
 
     PERSON_LIMIT: str = '50'
     GENRE_LIMIT: str = '1'
     FILMWORK_LIMIT: str = '200'
+    # Потолок адаптивного размера пачки изменённых id при отставании
+    BATCH_LIMIT_MAX: int = 2000
     RELAX_TIME: int = 2
 
+    # Хранилище состояния: file, redis или postgres; {namespace} - тип объекта (-o)
+    STATE_STORAGE: Literal['file', 'redis', 'postgres'] = 'file'
+    STATE_FILE: str = 'state_{namespace}.json'
+    # Ожидание изменений через LISTEN/NOTIFY: канал (тот же, что в триггерах
+    # movies_database.sql), окно сбора оповещений и запасной опрос по
+    # таймеру, если оповещений нет
+    ETL_LISTEN: bool = False
+    ETL_NOTIFY_CHANNEL: str = 'etl_changes'
+    ETL_DEBOUNCE: float = 0.5
+    ETL_POLL_INTERVAL: int = 60
+    # Строк за одно обращение к серверному курсору Postgres
+    PG_ITERSIZE: int = 2000
+
+    # Конвейер ETL: потоки на стадии, размер очередей (в пачках) и пачки строк.
+    # Потоки загрузки пишут параллельно только пачки одного прохода
+    ETL_TRANSFORM_WORKERS: int = 1
+    ETL_LOAD_WORKERS: int = 2
+    ETL_QUEUE_SIZE: int = 4
+    ETL_CHUNK_SIZE: int = 500
+
+    # Клиент ElasticSearch: соединений на узел, сжатие запросов, таймаут
+    ELASTIC_CONNECTIONS: int = 10
+    ELASTIC_HTTP_COMPRESS: bool = False
+    ELASTIC_TIMEOUT: int = 30
+    # Загрузка: bulk, streaming (streaming_bulk) или parallel (parallel_bulk)
+    ELASTIC_BULK_MODE: Literal['bulk', 'streaming', 'parallel'] = 'bulk'
+    ELASTIC_BULK_CHUNK_SIZE: int = 500
+    ELASTIC_BULK_THREADS: int = 4
+    # Хеши загруженных документов, чтобы не переписывать неизменившиеся:
+    # none, sqlite (файл на процесс) или redis
+    CONTENT_HASH_STORAGE: Literal['none', 'sqlite', 'redis'] = 'sqlite'
+    CONTENT_HASH_FILE: str = 'hashes_{namespace}.sqlite'
+    # --backfill: таймаут слияния сегментов (сек) и оставлять ли прежние версии индекса
+    BACKFILL_MERGE_TIMEOUT: int = 3600
+    BACKFILL_KEEP_OLD: bool = False
+    # Поток Redis, в который пишутся id загруженных документов для сброса кеша API
+    CACHE_INVALIDATION_ENABLED: bool = True
+    CACHE_INVALIDATION_STREAM: str = 'cache:invalidate'
+    CACHE_INVALIDATION_MAXLEN: int = 100000
+    # Не чаще чем раз в столько секунд просить API прогреть кеш после загрузки
+    CACHE_WARMUP_INTERVAL: int = 30
+
     TIMER_GENRES: str = '2020-06-16T20:14:09.310000+00:00'
     TIMER_PERSONS: str = '2020-06-16T20:14:09.310000+00:00'
     TIMER_FILMWORKS: str = '2020-06-16T20:14:09.310000+00:00'
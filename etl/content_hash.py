@@ -0,0 +1,100 @@
+import abc
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+def document_hash(document: dict) -> str:
+    """Хеш содержимого документа, не зависящий от порядка ключей."""
+    data = json.dumps(document, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+class HashIndex(abc.ABC):
+    """Хеши последних загруженных в ElasticSearch версий документов.
+
+    Позволяет не отправлять в bulk документы, которые не изменились
+    с прошлой загрузки.
+    """
+
+    @abc.abstractmethod
+    def get_many(self, index: str, ids: list[str]) -> dict[str, str]:
+        """Сохранённые хеши документов индекса по id."""
+
+    @abc.abstractmethod
+    def save_many(self, index: str, hashes: dict[str, str]) -> None:
+        """Запомнить хеши загруженных документов."""
+
+    @abc.abstractmethod
+    def clear(self, index: str) -> None:
+        """Забыть хеши индекса, например после его пересоздания."""
+
+    def changed(self, index: str, documents: list[dict]) -> tuple[list[dict], dict[str, str]]:
+        """Документы, чей хеш отличается от сохранённого, и их новые хеши."""
+        hashes = {str(document['id']): document_hash(document) for document in documents}
+        stored = self.get_many(index, list(hashes))
+        changed = [document for document in documents
+                   if stored.get(str(document['id'])) != hashes[str(document['id'])]]
+        return changed, {str(document['id']): hashes[str(document['id'])] for document in changed}
+
+
+class SqliteHashIndex(HashIndex):
+    """Хеши в локальном файле SQLite; доступ из потоков загрузки под блокировкой."""
+
+    # Ограничение SQLite на число параметров запроса
+    _BATCH = 900
+
+    def __init__(self, file_path: str) -> None:
+        self._lock = threading.Lock()
+        self.connect = sqlite3.connect(file_path, check_same_thread=False)
+        self.connect.execute("PRAGMA journal_mode=WAL;")
+        self.connect.execute("CREATE TABLE IF NOT EXISTS doc_hash ("
+                             "index_name TEXT NOT NULL, "
+                             "id TEXT NOT NULL, "
+                             "hash TEXT NOT NULL, "
+                             "PRIMARY KEY (index_name, id)) WITHOUT ROWID;")
+
+    def get_many(self, index: str, ids: list[str]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), self._BATCH):
+                batch = ids[start:start + self._BATCH]
+                rows = self.connect.execute(
+                    f"SELECT id, hash FROM doc_hash WHERE index_name = ? AND id IN ({','.join('?' * len(batch))});",
+                    (index, *batch))
+                found.update(rows)
+        return found
+
+    def save_many(self, index: str, hashes: dict[str, str]) -> None:
+        with self._lock, self.connect:
+            self.connect.executemany("INSERT OR REPLACE INTO doc_hash (index_name, id, hash) VALUES (?, ?, ?);",
+                                     [(index, id_, hash_) for id_, hash_ in hashes.items()])
+
+    def clear(self, index: str) -> None:
+        with self._lock, self.connect:
+            self.connect.execute("DELETE FROM doc_hash WHERE index_name = ?;", (index,))
+
+
+class RedisHashIndex(HashIndex):
+    """Хеши в Redis: по hash-ключу на индекс."""
+
+    def __init__(self, redis) -> None:
+        self.redis = redis
+
+    @staticmethod
+    def _key(index: str) -> str:
+        return f'etl:hashes:{index}'
+
+    def get_many(self, index: str, ids: list[str]) -> dict[str, str]:
+        if not ids:
+            return {}
+        values = self.redis.hmget(self._key(index), ids)
+        return {id_: value.decode() for id_, value in zip(ids, values) if value is not None}
+
+    def save_many(self, index: str, hashes: dict[str, str]) -> None:
+        if hashes:
+            self.redis.hset(self._key(index), mapping=hashes)
+
+    def clear(self, index: str) -> None:
+        self.redis.delete(self._key(index))
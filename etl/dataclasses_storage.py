@@ -2,7 +2,19 @@ import uuid
 from dataclasses import dataclass, field
 
 
-@dataclass
+def to_document(obj) -> dict:
+    """Поля датакласса в словарь без глубокого копирования, в отличие от asdict.
+
+    Вложенные списки и словари датаклассы собирают сами, поэтому копировать их не нужно.
+    """
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+
+# Роли персон в фильме и поля документа фильма, куда они попадают
+ROLES = {"actor": "actors", "writer": "writers", "director": "directors"}
+
+
+@dataclass(slots=True)
 class FilmWork:
     id: uuid.UUID
     title: str
@@ -18,25 +30,18 @@ class FilmWork:
     directors: list = field(init=False)
 
     def __post_init__(self):
-        self.actors_names, self.actors = [], []
-        self.writers_names, self.writers = [], []
-        self.directors_names, self.directors = [], []
+        by_role = {role: [] for role in ROLES}
         for person in self.persons:
-            if person["person_role"] == "actor":
-                self.actors_names.append(person["person_name"])
-                person_dict = {"id": person["person_id"], "name": person["person_name"]}
-                self.actors.append(person_dict)
-            elif person["person_role"] == "writer":
-                self.writers_names.append(person["person_name"])
-                person_dict = {"id": person["person_id"], "name": person["person_name"]}
-                self.writers.append(person_dict)
-            elif person["person_role"] == "director":
-                self.directors_names.append(person["person_name"])
-                person_dict = {"id": person["person_id"], "name": person["person_name"]}
-                self.directors.append(person_dict)
+            people = by_role.get(person["person_role"])
+            if people is not None:
+                people.append({"id": person["person_id"], "name": person["person_name"]})
+        self.actors, self.writers, self.directors = by_role["actor"], by_role["writer"], by_role["director"]
+        self.actors_names = [person["name"] for person in self.actors]
+        self.writers_names = [person["name"] for person in self.writers]
+        self.directors_names = [person["name"] for person in self.directors]
 
 
-@dataclass
+@dataclass(slots=True)
 class FilmsInPerson:
     filmwork_id: uuid.UUID
     roles: str | list
@@ -44,25 +49,25 @@ class FilmsInPerson:
     imdb_rating: float
 
 
-@dataclass
+@dataclass(slots=True)
 class Person:
     id: uuid.UUID
     full_name: str
     films: list[FilmsInPerson]
 
     def __post_init__(self):
-        unique_films = []
+        # Строка на каждую роль в фильме сворачивается в один фильм со списком ролей
+        unique_films = {}
         for film in self.films:
-            if any(x['filmwork_id'] == film['filmwork_id'] for x in unique_films):
-                for unqie_film in unique_films:
-                    if film['filmwork_id'] == unqie_film['filmwork_id'] and film['roles'] not in unqie_film['roles']:
-                        unqie_film['roles'].append(film['roles'])
-            else:
-                film['roles'] = [film['roles']]
-                unique_films.append(film)
-        self.films = unique_films
+            unique_film = unique_films.get(film['filmwork_id'])
+            if unique_film is None:
+                unique_films[film['filmwork_id']] = {**film, 'roles': [film['roles']]}
+            elif film['roles'] not in unique_film['roles']:
+                unique_film['roles'].append(film['roles'])
+        self.films = list(unique_films.values())
+
 
-@dataclass
+@dataclass(slots=True)
 class Genre:
     id: uuid.UUID
-    name: str
\ No newline at end of file
+    name: str
@@ -0,0 +1,90 @@
+import logging
+import threading
+from typing import Iterable
+
+from redis.exceptions import RedisError
+
+
+class CachePublisher:
+    """Публикация id записанных документов в поток Redis для сброса кеша API.
+
+    Поток ограничен примерно maxlen сообщениями, чтобы не расти бесконечно;
+    API перечитывает его при старте только за последний час. В тот же поток
+    после загрузки пишется просьба прогреть кеш: она обрабатывается после
+    всех сбросов, опубликованных раньше неё.
+
+    Кеш API - побочный канал, и загрузка в ElasticSearch от него не зависит:
+    если Redis недоступен, сообщения копятся в памяти и отправляются при
+    следующей публикации. Когда их набирается больше MAX_PENDING_IDS на
+    индекс, вместо них отправляется сброс всего кеша индекса.
+    """
+
+    MAX_PENDING_IDS = 10000
+
+    def __init__(self, redis, stream: str, maxlen: int) -> None:
+        self.redis = redis
+        self.stream = stream
+        self.maxlen = maxlen
+        self._lock = threading.Lock()
+        self._flushes: set[str] = set()
+        self._pending: dict[str, set[str]] = {}
+        self._pending_genres: dict[str, set[str]] = {}
+        self._warmup = False
+
+    def publish(self, index: str, ids: list[str], genres: Iterable[str] = ()) -> None:
+        """Сбросить кеш документов ids; genres - жанры записанных фильмов,
+        чтобы API сбросил списки этих жанров, куда фильм мог войти."""
+        with self._lock:
+            if ids and index not in self._flushes:
+                pending = self._pending.setdefault(index, set())
+                pending.update(ids)
+                self._pending_genres.setdefault(index, set()).update(genres)
+                if len(pending) > self.MAX_PENDING_IDS:
+                    self._flushes.add(index)
+                    del self._pending[index]
+                    del self._pending_genres[index]
+            self._send()
+
+    def flush(self, index: str) -> None:
+        """Сбросить весь кеш индекса, например после переключения алиаса."""
+        with self._lock:
+            self._flushes.add(index)
+            # Сброс индекса покрывает и отдельные id
+            self._pending.pop(index, None)
+            self._pending_genres.pop(index, None)
+            self._send()
+
+    def request_warmup(self) -> None:
+        with self._lock:
+            self._warmup = True
+            self._send()
+
+    def retry(self) -> None:
+        """Отправить сообщения, не отправленные из-за недоступности Redis."""
+        with self._lock:
+            self._send()
+
+    def _send(self) -> None:
+        try:
+            for index in sorted(self._flushes):
+                self._xadd(index, '*')
+                self._flushes.discard(index)
+            for index in sorted(self._pending):
+                genres = self._pending_genres.pop(index, set())
+                try:
+                    self._xadd(index, ','.join(self._pending[index]), ','.join(sorted(genres)))
+                except RedisError:
+                    self._pending_genres[index] = genres
+                    raise
+                del self._pending[index]
+            if self._warmup:
+                self._xadd('warmup', '')
+                self._warmup = False
+        except RedisError as exc:
+            logging.warning(f"Не удалось опубликовать сброс кеша API, повтор при следующей загрузке: {exc}")
+
+    def _xadd(self, index: str, ids: str, genres: str = '') -> None:
+        fields = {'index': index, 'ids': ids}
+        if genres:
+            fields['genres'] = genres
+        self.redis.xadd(self.stream, fields, maxlen=self.maxlen, approximate=True)
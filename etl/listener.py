@@ -0,0 +1,52 @@
+import logging
+import select
+import time
+
+import psycopg2
+
+
+class ChangeListener:
+    """Ожидание изменений в Postgres через LISTEN/NOTIFY вместо сна.
+
+    Триггеры на таблицах с полем modified шлют NOTIFY в канал; слушатель
+    просыпается по первому оповещению и ещё debounce секунд собирает
+    следующие, чтобы серия правок ушла в ETL одним проходом.
+    """
+
+    def __init__(self, dsl: dict, channel: str, debounce: float):
+        self.channel = channel
+        self.debounce = debounce
+        self.connect = psycopg2.connect(**dsl)
+        self.connect.autocommit = True
+        with self.connect.cursor() as cursor:
+            cursor.execute(f'LISTEN "{channel}";')
+
+    def wait(self, timeout: float) -> set[str]:
+        """Дождаться изменений не дольше timeout; вернуть имена изменённых таблиц.
+
+        Пустой результат - изменений не было, и стоит опросить базу по таймеру.
+        """
+        if not self._poll(timeout):
+            return set()
+        tables = self._drain()
+        deadline = time.monotonic() + self.debounce
+        while (left := deadline - time.monotonic()) > 0 and self._poll(left):
+            tables |= self._drain()
+        logging.info(f"Оповещения об изменениях: {', '.join(sorted(tables))}")
+        return tables
+
+    def _poll(self, timeout: float) -> bool:
+        if self.connect.notifies:
+            return True
+        if select.select([self.connect], [], [], timeout) == ([], [], []):
+            return False
+        self.connect.poll()
+        return bool(self.connect.notifies)
+
+    def _drain(self) -> set[str]:
+        tables = {notify.payload for notify in self.connect.notifies}
+        self.connect.notifies.clear()
+        return tables
+
+    def close(self):
+        self.connect.close()
@@ -47,14 +47,34 @@ CREATE TABLE IF NOT EXISTS content.person_film_work (
 CREATE INDEX film_work_title_idx ON content.film_work(title);
 CREATE INDEX film_work_creation_date_idx ON content.film_work(creation_date);
 CREATE INDEX film_work_rating_idx ON content.film_work(rating);
+CREATE INDEX film_work_modified_id_idx ON content.film_work(modified, id);
 
 CREATE INDEX genre_name_idx ON content.genre(name);
+CREATE INDEX genre_modified_id_idx ON content.genre(modified, id);
 
 CREATE INDEX person_full_name_idx ON content.person(full_name);
+CREATE INDEX person_modified_id_idx ON content.person(modified, id);
 
 CREATE UNIQUE INDEX film_work_genre_idx ON content.genre_film_work (film_work_id, genre_id);
 CREATE UNIQUE INDEX film_work_person_role_idx ON content.person_film_work (film_work_id, person_id, role);
 
+-- Оповещение ETL об изменениях (ETL_LISTEN): один NOTIFY на оператор с именем
+-- таблицы в канал ETL_NOTIFY_CHANNEL; одинаковые оповещения внутри транзакции
+-- Postgres схлопывает сам
+CREATE OR REPLACE FUNCTION content.etl_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(TG_ARGV[0], TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER etl_notify AFTER INSERT OR UPDATE OR DELETE ON content.film_work
+    FOR EACH STATEMENT EXECUTE FUNCTION content.etl_notify('etl_changes');
+CREATE OR REPLACE TRIGGER etl_notify AFTER INSERT OR UPDATE OR DELETE ON content.person
+    FOR EACH STATEMENT EXECUTE FUNCTION content.etl_notify('etl_changes');
+CREATE OR REPLACE TRIGGER etl_notify AFTER INSERT OR UPDATE OR DELETE ON content.genre
+    FOR EACH STATEMENT EXECUTE FUNCTION content.etl_notify('etl_changes');
+
 COPY content.film_work (id, title, description, creation_date, rating, type, created, modified, file_path) FROM stdin;
 3d825f60-9fff-4dfe-b294-1a45fa1e115d	Star Wars: Episode IV - A New Hope	The Imperial Forces, under orders from cruel Darth Vader, hold Princess Leia hostage in their efforts to quell the rebellion against the Galactic Empire. Luke Skywalker and Han Solo, captain of the Millennium Falcon, work together with the companionable droid duo R2-D2 and C-3PO to rescue the beautiful princess, help the Rebel Alliance and restore freedom and justice to the Galaxy.	\N	8.6	movie	2021-06-16 20:14:09.221838+00	2021-06-16 20:14:09.221855+00	\N
 0312ed51-8833-413f-bff5-0e139c11264a	Star Wars: Episode V - The Empire Strikes Back	Luke Skywalker, Han Solo, Princess Leia and Chewbacca face attack by the Imperial forces and its AT-AT walkers on the ice planet Hoth. While Han and Leia escape in the Millennium Falcon, Luke travels to Dagobah in search of Yoda. Only with the Jedi master's help will Luke survive when the dark side of the Force beckons him into the ultimate duel with Darth Vader.	\N	8.7	movie	2021-06-16 20:14:09.221939+00	2021-06-16 20:14:09.221958+00	\N
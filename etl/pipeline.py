@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Iterable
+
+_STOP = object()
+
+
+class _Cycle:
+    """Один проход извлечения: чекпоинт и число ещё не загруженных пачек."""
+
+    def __init__(self, checkpoint: Any):
+        self.checkpoint = checkpoint
+        self.pending = 0
+        self.extracted = False
+
+
+class Pipeline:
+    """Конвейер extract -> transform -> load с ограниченными очередями.
+
+    Извлечение идёт в вызывающем потоке, преобразование и загрузка - в пулах
+    потоков. Очереди между стадиями ограничены queue_size пачками, поэтому
+    быстрая стадия ждёт медленную, а не копит данные в памяти. Чекпоинт прохода
+    (таймеры состояния) сохраняется через commit только после загрузки всех его
+    пачек и строго в порядке проходов.
+
+    Пачки одного прохода загружаются параллельно, но следующий проход
+    начинает извлекаться только после загрузки предыдущего: один и тот же
+    документ может попасть в соседние проходы, и его старая версия не должна
+    записаться в ElasticSearch позже новой.
+    """
+
+    def __init__(self,
+                 transform: Callable[[list], list],
+                 load: Callable[[list], None],
+                 commit: Callable[[Any], None],
+                 transform_workers: int = 1,
+                 load_workers: int = 1,
+                 queue_size: int = 4,
+                 chunk_size: int = 500):
+        self.transform = transform
+        self.load = load
+        self.commit = commit
+        self.transform_workers = transform_workers
+        self.load_workers = load_workers
+        self.chunk_size = chunk_size
+        self._transform_queue = queue.Queue(maxsize=queue_size)
+        self._load_queue = queue.Queue(maxsize=queue_size)
+        self._cycles: deque[_Cycle] = deque()
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+        self._error: BaseException | None = None
+        self._failed = threading.Event()
+
+    def run(self, cycles: Iterable[tuple[Iterable, Any]]) -> None:
+        """Прогнать через конвейер проходы вида (строки, чекпоинт).
+
+        Ошибка любой стадии останавливает конвейер и пробрасывается наружу;
+        незакоммиченные проходы будут повторены при следующем запуске.
+        """
+        transformers = [threading.Thread(target=self._transform_worker, daemon=True)
+                        for _ in range(self.transform_workers)]
+        loaders = [threading.Thread(target=self._load_worker, daemon=True)
+                   for _ in range(self.load_workers)]
+        for thread in transformers + loaders:
+            thread.start()
+        try:
+            for rows, checkpoint in cycles:
+                self._extract(rows, checkpoint)
+                if self._failed.is_set():
+                    break
+        finally:
+            self._shutdown(self._transform_queue, transformers)
+            self._shutdown(self._load_queue, loaders)
+        if self._error is not None:
+            raise self._error
+
+    def _extract(self, rows: Iterable, checkpoint: Any):
+        cycle = _Cycle(checkpoint)
+        with self._loaded:
+            # Ждём загрузки и коммита всех прежних проходов
+            self._loaded.wait_for(lambda: not self._cycles or self._failed.is_set())
+            if self._failed.is_set():
+                return
+            self._cycles.append(cycle)
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            with self._lock:
+                cycle.pending += 1
+            if not self._put(self._transform_queue, (cycle, chunk)):
+                return
+        with self._lock:
+            cycle.extracted = True
+            self._commit_ready()
+
+    def _transform_worker(self):
+        while (item := self._transform_queue.get()) is not _STOP:
+            if self._failed.is_set():
+                continue
+            cycle, chunk = item
+            try:
+                documents = self.transform(chunk)
+            except BaseException as exc:
+                self._fail(exc)
+                continue
+            self._put(self._load_queue, (cycle, documents))
+
+    def _load_worker(self):
+        while (item := self._load_queue.get()) is not _STOP:
+            if self._failed.is_set():
+                continue
+            cycle, documents = item
+            try:
+                if documents:
+                    self.load(documents)
+                with self._lock:
+                    cycle.pending -= 1
+                    self._commit_ready()
+            except BaseException as exc:
+                self._fail(exc)
+
+    def _commit_ready(self):
+        """Сохранить чекпоинты всех полностью загруженных проходов подряд."""
+        while self._cycles and self._cycles[0].extracted and not self._cycles[0].pending:
+            if self._failed.is_set():
+                return
+            self.commit(self._cycles.popleft().checkpoint)
+            self._loaded.notify_all()
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        # Ждём места в очереди, но не вечно: стадия за ней могла упасть
+        while not self._failed.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, exc: BaseException):
+        with self._lock:
+            if self._error is None:
+                self._error = exc
+                logging.exception('Ошибка в конвейере ETL', exc_info=exc)
+            self._failed.set()
+            self._loaded.notify_all()
+
+    @staticmethod
+    def _shutdown(target: queue.Queue, threads: list[threading.Thread]):
+        # После ошибки воркеры не обрабатывают, а только выбирают очередь до _STOP
+        for _ in threads:
+            target.put(_STOP)
+        for thread in threads:
+            thread.join()
@@ -1,22 +1,32 @@
 import logging.config
 import time
 from contextlib import closing
-from dataclasses import asdict
+from datetime import datetime
 import argparse
+import threading
+import uuid
+from collections import Counter, defaultdict
 
 import backoff
 import psycopg2
 from dotenv import load_dotenv
 from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import ConnectionError as ElasticConnectionError
-from elasticsearch.helpers import bulk
+from elasticsearch.exceptions import ConnectionError as ElasticConnectionError, NotFoundError
+from elasticsearch.helpers import bulk, parallel_bulk, streaming_bulk
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
+from redis import Redis
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 
-from dataclasses_storage import FilmWork, Person, Genre
+from dataclasses_storage import FilmWork, Person, Genre, to_document
 from elastic_schema import schema_movies, schema_persons, schema_genres
+from change_feed import ChangeFeed, ChangeSet
+from content_hash import HashIndex, RedisHashIndex, SqliteHashIndex
+from invalidation import CachePublisher
+from listener import ChangeListener
+from pipeline import Pipeline
 from sql_bank import *
-from state import JsonFileStorage, State
+from state import BaseStorage, JsonFileStorage, PostgresStorage, RedisStorage, State
 from config import settings
 
 load_dotenv()
@@ -26,77 +36,101 @@ logging.config.fileConfig('logger.conf')
 class PostgresExtractor:
     def __init__(self, pg_conn: _connection):
         self.connect = pg_conn
-
-    def extract_timer_and_ids(self, data: list, timer: str):
-            if data:
-                last_input = data[-1][1].isoformat()
-                id = tuple(i[0] for i in data)
-                if len(data) == 1:
-                    id = tuple([id[0]])
-            else:
-                last_input = timer
-                id = tuple(["00000000-0000-0000-0000-000000000000"])
-            return last_input, id
+        self.base_limits = {
+            'person': int(settings.PERSON_LIMIT),
+            'genre': int(settings.GENRE_LIMIT),
+            'film_work': int(settings.FILMWORK_LIMIT),
+        }
+        self.limits = dict(self.base_limits)
+
+    def stream(self, query: str, params: tuple = None):
+        """Построчная выгрузка через именованный (серверный) курсор.
+
+        Строки приходят с сервера пачками по PG_ITERSIZE, поэтому память
+        не зависит от размера результата. Генератор ленивый: запрос
+        выполняется при первом чтении, транзакция закрывается после
+        последней строки.
+        """
+        try:
+            with self.connect.cursor(name=f'etl_{uuid.uuid4().hex}') as cursor:
+                cursor.itersize = settings.PG_ITERSIZE
+                cursor.execute(query, params)
+                yield from cursor
+        finally:
+            self.connect.rollback()
+
+    def now(self) -> str:
+        cursor = self.connect.cursor()
+        cursor.execute(SQL_NOW)
+        return cursor.fetchone()[0].isoformat()
+
+    def extract_changes(self, query: str, table: str, timer: list) -> tuple[list, tuple]:
+        """Следующая пачка изменённых id таблицы после позиции timer.
+
+        Позиция - пара (modified, id) последней обработанной строки: строки
+        с одинаковым modified на границе пачки не теряются и не выбираются
+        повторно. Размер пачки растёт вдвое, пока пачки приходят полными
+        (есть отставание), и возвращается к базовому, когда оно разобрано.
+        """
+        modified, last_id = timer if isinstance(timer, list) else (timer, ZERO_ID)
+        limit = self.limits[table]
+        cursor = self.connect.cursor()
+        cursor.execute(query, (modified, last_id, limit))
+        data = cursor.fetchall()
+        if len(data) >= limit:
+            self.limits[table] = min(limit * 2, max(settings.BATCH_LIMIT_MAX, self.base_limits[table]))
+        else:
+            self.limits[table] = max(limit // 2, self.base_limits[table])
+        if not data:
+            return [modified, last_id], (ZERO_ID,)
+        return [data[-1][1].isoformat(), str(data[-1][0])], tuple(row[0] for row in data)
+
+    def detect_changes(self, timers: dict) -> tuple[dict, dict]:
+        """Изменённые id всех таблиц за один проход: (позиции после прохода, id)."""
+        positions, ids = {}, {}
+        for key, (query, table) in TIMER_TABLES.items():
+            positions[key], ids[key] = self.extract_changes(query, table, timers[key])
+        self.connect.rollback()
+        return positions, ids
 
     def extract_modified_data_movies(self,
-                                     timer_genres: str,
-                                     timer_persons: str,
-                                     timer_filmworks: str):
+                                     timer_genres: list,
+                                     timer_persons: list,
+                                     timer_filmworks: list):
         """Выгрузка измененных данных из PostgreSQL (movies и связанные с ними)"""
 
-        cursor = self.connect.cursor()
-        cursor.execute(SQL_LAST_INSERTED_PERSONS, (timer_persons, settings.PERSON_LIMIT))
-        data_persons = cursor.fetchall()
-        last_input_persons, persons_id = self.extract_timer_and_ids(data_persons, timer_persons)
-
-        cursor.execute(SQL_LAST_INSERTED_GENRES, (timer_genres, settings.GENRE_LIMIT))
-        data_genres = cursor.fetchall()
-        last_input_genres, genres_id = self.extract_timer_and_ids(data_genres, timer_genres)
-
-        cursor.execute(SQL_LAST_INSERTED_TIME_FILMWORKS, (timer_filmworks, settings.FILMWORK_LIMIT))
-        data_filmworks = cursor.fetchall()
-        last_input_filmworks, filmworks_id = self.extract_timer_and_ids(data_filmworks, timer_filmworks)
+        last_input_persons, persons_id = self.extract_changes(SQL_LAST_INSERTED_PERSONS, 'person', timer_persons)
+        last_input_genres, genres_id = self.extract_changes(SQL_LAST_INSERTED_GENRES, 'genre', timer_genres)
+        last_input_filmworks, filmworks_id = self.extract_changes(SQL_LAST_INSERTED_TIME_FILMWORKS, 'film_work',
+                                                                  timer_filmworks)
 
-        cursor.execute(ALL_MODIFIED_MOVIES, (persons_id, genres_id, filmworks_id))
-        movies_from_postgres = cursor.fetchall()
+        movies_from_postgres = self.stream(ALL_MODIFIED_MOVIES, (persons_id, genres_id, filmworks_id))
 
         return movies_from_postgres, [last_input_genres, last_input_persons, last_input_filmworks]
 
     def extract_modified_data_persons(self,
-                                      timer_persons: str,
-                                      timer_filmworks: str):
+                                      timer_persons: list,
+                                      timer_filmworks: list):
         """Выгрузка измененных данных из PostgreSQL (persons и связанные с ними)"""
 
-        cursor = self.connect.cursor()
-        cursor.execute(SQL_LAST_INSERTED_PERSONS, (timer_persons, settings.PERSON_LIMIT))
-        data_persons = cursor.fetchall()
-        last_input_persons, persons_id = self.extract_timer_and_ids(data_persons, timer_persons)
-
-        cursor.execute(SQL_LAST_INSERTED_TIME_FILMWORKS, (timer_filmworks, settings.FILMWORK_LIMIT))
-        data_filmworks = cursor.fetchall()
-        last_input_filmworks, filmworks_id = self.extract_timer_and_ids(data_filmworks, timer_filmworks)
+        last_input_persons, persons_id = self.extract_changes(SQL_LAST_INSERTED_PERSONS, 'person', timer_persons)
+        last_input_filmworks, filmworks_id = self.extract_changes(SQL_LAST_INSERTED_TIME_FILMWORKS, 'film_work',
+                                                                  timer_filmworks)
 
-        cursor.execute(ALL_MODIFIED_PERSONS, (filmworks_id, persons_id))
-        persons_from_postgres = cursor.fetchall()
+        persons_from_postgres = self.stream(ALL_MODIFIED_PERSONS, (filmworks_id, persons_id))
 
         return persons_from_postgres, [last_input_persons, last_input_filmworks]
 
     def extract_modified_data_genres(self,
-                                     timer_genres: str,
-                                     timer_filmworks: str):
+                                     timer_genres: list,
+                                     timer_filmworks: list):
         """Выгрузка измененных данных из PostgreSQL (genres и связанные с ними)"""
 
-        cursor = self.connect.cursor()
-        cursor.execute(SQL_LAST_INSERTED_GENRES, (timer_genres, settings.GENRE_LIMIT))
-        data_genres = cursor.fetchall()
-        last_input_genres, genres_id = self.extract_timer_and_ids(data_genres, timer_genres)
-
-        cursor.execute(SQL_LAST_INSERTED_TIME_FILMWORKS, (timer_filmworks, settings.FILMWORK_LIMIT))
-        data_filmworks = cursor.fetchall()
-        last_input_filmworks, filmworks_id = self.extract_timer_and_ids(data_filmworks, timer_filmworks)
+        last_input_genres, genres_id = self.extract_changes(SQL_LAST_INSERTED_GENRES, 'genre', timer_genres)
+        last_input_filmworks, filmworks_id = self.extract_changes(SQL_LAST_INSERTED_TIME_FILMWORKS, 'film_work',
+                                                                  timer_filmworks)
 
-        cursor.execute(ALL_MODIFIED_GENRES, (filmworks_id, genres_id))
-        genres_from_postgres = cursor.fetchall()
+        genres_from_postgres = self.stream(ALL_MODIFIED_GENRES, (filmworks_id, genres_id))
 
         return genres_from_postgres, [last_input_genres, last_input_filmworks]
 
@@ -109,162 +143,536 @@ class DataTransform:
             del d[key]
             return d
 
-        data = [removekey(asdict(FilmWork(*movie)), "persons") for movie in rows]
+        data = [removekey(to_document(FilmWork(*movie)), "persons") for movie in rows]
         return data
 
     def persons_from_postgres_to_elastic(self, rows: list):
         """Подготовка персон для вставки в ElasticSearch"""
-        data = [asdict(Person(*person)) for person in rows]
+        data = [to_document(Person(*person)) for person in rows]
         return data
     
     def genres_from_postgres_to_elastic(self, rows: list):
         """Подготовка жанров для вставки в ElasticSearch"""
-        data = [asdict(Genre(*genre)) for genre in rows]
+        data = [to_document(Genre(*genre)) for genre in rows]
         return data
 
 
+# Индекс -> запрос полной выгрузки и схема для --backfill
+BACKFILL_SOURCES = {
+    'movies': (ALL_MOVIES, schema_movies),
+    'persons': (ALL_PERSONS, schema_persons),
+    'genres': (ALL_GENRES, schema_genres),
+}
+
+# Таймер -> запрос изменённых id и таблица для адаптивного размера пачки
+TIMER_TABLES = {
+    "timer_persons": (SQL_LAST_INSERTED_PERSONS, 'person'),
+    "timer_genres": (SQL_LAST_INSERTED_GENRES, 'genre'),
+    "timer_filmworks": (SQL_LAST_INSERTED_TIME_FILMWORKS, 'film_work'),
+}
+
+# Индекс -> запрос денормализации, таймеры в порядке его параметров, преобразование
+SHARED_SOURCES = {
+    'movies': (ALL_MODIFIED_MOVIES, ["timer_persons", "timer_genres", "timer_filmworks"],
+               DataTransform().movies_from_postgres_to_elastic),
+    'persons': (ALL_MODIFIED_PERSONS, ["timer_filmworks", "timer_persons"],
+                DataTransform().persons_from_postgres_to_elastic),
+    'genres': (ALL_MODIFIED_GENRES, ["timer_filmworks", "timer_genres"],
+               DataTransform().genres_from_postgres_to_elastic),
+}
+
+
 class ElasticsearchLoader:
-    def upload_to_elastic(self, data_for_elastic: list, index_name: str):
+    """Загрузчик в ElasticSearch с одним долгоживущим клиентом.
+
+    Клиент держит пул keep-alive соединений к каждому узлу и переиспользуется
+    всеми пачками и потоками конвейера, поэтому соединение не открывается
+    заново на каждую загрузку. С индексом хешей в bulk уходят только
+    документы, изменившиеся с прошлой загрузки. Id записанных документов
+    публикуются для сброса кеша API.
+    """
+
+    def __init__(self, hashes: HashIndex | None = None, publisher: CachePublisher | None = None):
+        self.hashes = hashes
+        self.publisher = publisher
+        self.stats = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
+        self._written_since_warmup = False
+        self._warmup_requested = float('-inf')
+        self.client = Elasticsearch(
+            f'http://{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}',
+            connections_per_node=settings.ELASTIC_CONNECTIONS,
+            http_compress=settings.ELASTIC_HTTP_COMPRESS,
+            request_timeout=settings.ELASTIC_TIMEOUT,
+            retry_on_timeout=True,
+        )
+
+    def upload_to_elastic(self, data_for_elastic: list, index_name: str, skip_unchanged: bool = True,
+                          publish: bool = True):
         """Вставка данных в ElasticSearch"""
-        with Elasticsearch(f'http://{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}') as es:
-            actions = [
-                {
-                    "_index": index_name,
-                    "_id": data["id"],
-                    "_source": data,
-                    "doc_as_upsert": True
-                } for data in data_for_elastic
-            ]
-            bulk(es, actions)
-            logging.info(f"В ElasticSearch обновлены {len(data_for_elastic)} данных в индексе {index_name}")
-
-
-def postgres_to_elastic_movies(pg_conn: _connection):
-    """Основной метод загрузки movies из Postgres в Elastic"""
-    while True:
-        timer_genres = state.get_state("timer_genres")
-        timer_persons = state.get_state("timer_persons")
-        timer_filmworks = state.get_state("timer_filmworks")
-        postgres_exporter = PostgresExtractor(pg_conn)
-        data_from_postgres, timers = postgres_exporter.extract_modified_data_movies(
-            timer_genres, timer_persons, timer_filmworks
+        total = len(data_for_elastic)
+        hashes = None
+        if self.hashes is not None and skip_unchanged:
+            data_for_elastic, hashes = self.hashes.changed(index_name, data_for_elastic)
+        if data_for_elastic:
+            self._bulk(data_for_elastic, index_name)
+            if self.publisher is not None and publish:
+                self.publisher.publish(index_name, [str(data["id"]) for data in data_for_elastic],
+                                       {genre for data in data_for_elastic for genre in data.get("genres") or ()
+                                        if genre})
+        # Хеши сохраняются только после успешной загрузки: иначе при сбое повторная
+        # загрузка пропустила бы документ. Неотправленный сброс кеша ждёт в publisher
+        if hashes:
+            self.hashes.save_many(index_name, hashes)
+
+        written, skipped = len(data_for_elastic), total - len(data_for_elastic)
+        with self._stats_lock:
+            stats = self.stats[index_name]
+            stats['written'] += written
+            stats['skipped'] += skipped
+            totals = dict(stats)
+            self._written_since_warmup |= written > 0
+        logging.info(f"В ElasticSearch обновлены {written} данных в индексе {index_name}, "
+                     f"пропущены без изменений {skipped} (всего записано {totals['written']}, "
+                     f"пропущено {totals['skipped']})")
+
+    def request_warmup(self):
+        """Попросить API прогреть кеш, если с прошлой просьбы что-то записано.
+
+        Вызывается после каждого прохода, поэтому заодно повторяет сбросы
+        кеша, которые не удалось отправить раньше.
+        """
+        if self.publisher is None:
+            return
+        with self._stats_lock:
+            now = time.monotonic()
+            due = self._written_since_warmup and now - self._warmup_requested >= settings.CACHE_WARMUP_INTERVAL
+            if due:
+                self._written_since_warmup = False
+                self._warmup_requested = now
+        if due:
+            self.publisher.request_warmup()
+        else:
+            self.publisher.retry()
+
+    def _bulk(self, data_for_elastic: list, index_name: str):
+        actions = (
+            {
+                "_index": index_name,
+                "_id": data["id"],
+                "_source": data,
+                "doc_as_upsert": True
+            } for data in data_for_elastic
         )
-        transfer = DataTransform()
-        all_movies_elastic = transfer.movies_from_postgres_to_elastic(data_from_postgres)
-        if all_movies_elastic:
-            loader = ElasticsearchLoader()
-            loader.upload_to_elastic(all_movies_elastic, 'movies')
-            state.set_state("timer_genres", timers[0])
-            state.set_state("timer_persons", timers[1])
-            state.set_state("timer_filmworks", timers[2])
+        if settings.ELASTIC_BULK_MODE == 'parallel':
+            results = parallel_bulk(self.client, actions,
+                                    thread_count=settings.ELASTIC_BULK_THREADS,
+                                    chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE)
+        elif settings.ELASTIC_BULK_MODE == 'streaming':
+            results = streaming_bulk(self.client, actions, chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE)
         else:
-            logging.info("Нет данных для обновления")
+            bulk(self.client, actions, chunk_size=settings.ELASTIC_BULK_CHUNK_SIZE)
+            results = ()
+        # parallel_bulk и streaming_bulk ленивые: пачки уходят по мере чтения результатов
+        for _ in results:
+            pass
+
+    def create_index(self, index: str, body: str):
+        try:
+            self.client.indices.create(index=index, body=body)
+            logging.info(f"Индекс {index} создан")
+            # В новом индексе нет документов, старые хеши к нему не относятся
+            if self.hashes is not None:
+                self.hashes.clear(index)
+        except:
+            logging.info(f"Индекс {index} уже существует")
+
+    def create_backfill_index(self, alias: str, body: dict) -> str:
+        """Следующая версия индекса (movies_v1, movies_v2, ...) для полной загрузки.
+
+        На время загрузки обновление поиска выключено и реплик нет:
+        сегменты не сбрасываются каждую секунду и не копируются на реплики.
+        """
+        versions = [int(version) for version in
+                    (name.rsplit('_v', 1)[-1] for name in self.client.indices.get(index=f'{alias}_v*'))
+                    if version.isdigit()]
+        index = f'{alias}_v{max(versions, default=0) + 1}'
+        index_settings = {**body['settings'], 'refresh_interval': '-1', 'number_of_replicas': 0}
+        self.client.indices.create(index=index, body={**body, 'settings': index_settings})
+        return index
+
+    def finish_backfill(self, alias: str, index: str, body: dict):
+        """Вернуть настройки индекса, слить сегменты и атомарно переключить на него алиас."""
+        # None сбрасывает настройку к значению ElasticSearch по умолчанию
+        self.client.indices.put_settings(index=index, settings={
+            'refresh_interval': body['settings'].get('refresh_interval'),
+            'number_of_replicas': body['settings'].get('number_of_replicas'),
+        })
+        self.client.indices.refresh(index=index)
+        self.client.options(request_timeout=settings.BACKFILL_MERGE_TIMEOUT).indices.forcemerge(
+            index=index, max_num_segments=1)
+
+        try:
+            previous = list(self.client.indices.get_alias(name=alias))
+        except NotFoundError:
+            previous = []
+        actions = [{'remove': {'index': old, 'alias': alias}} for old in previous]
+        if not previous and self.client.indices.exists(index=alias):
+            # Индекс, созданный до перехода на алиасы, удаляется в том же атомарном запросе
+            actions.append({'remove_index': {'index': alias}})
+        actions.append({'add': {'index': index, 'alias': alias}})
+        self.client.indices.update_aliases(actions=actions)
+
+        if not settings.BACKFILL_KEEP_OLD:
+            for old in previous:
+                if old != index:
+                    self.client.indices.delete(index=old)
+        # Документы индекса загружены заново, прежние хеши к нему не относятся
+        if self.hashes is not None:
+            self.hashes.clear(alias)
+        # Кеш API собран из прежней версии индекса: сбросить его целиком и прогреть заново
+        if self.publisher is not None:
+            self.publisher.flush(alias)
+            self.publisher.request_warmup()
+
+    def close(self):
+        self.client.close()
+
+
+listener: ChangeListener | None = None
+
+
+def wait_for_changes():
+    """Пауза между проходами без изменений.
+
+    С ETL_LISTEN ждём NOTIFY от триггеров Postgres, а опрос по таймеру
+    остаётся запасным вариантом раз в ETL_POLL_INTERVAL секунд. Если
+    слушатель недоступен, работаем опросом раз в RELAX_TIME.
+    """
+    global listener
+    if not settings.ETL_LISTEN:
+        time.sleep(settings.RELAX_TIME)
+        return
+    try:
+        if listener is None:
+            listener = ChangeListener(settings.dsl, settings.ETL_NOTIFY_CHANNEL, settings.ETL_DEBOUNCE)
+        listener.wait(settings.ETL_POLL_INTERVAL)
+    except psycopg2.Error:
+        logging.exception("LISTEN недоступен, опрос по таймеру")
+        if listener is not None:
+            listener.close()
+            listener = None
         time.sleep(settings.RELAX_TIME)
 
 
-def postgres_to_elastic_persons(pg_conn: _connection):
-    """Основной метод загрузки persons из Postgres в Elastic"""
+def extract_cycles(extract, timer_keys: list[str], timers: list[str] = None):
+    """Проходы извлечения для конвейера: (строки, таймеры после прохода).
+
+    Таймеры между проходами ведутся в памяти, поэтому следующий проход
+    не ждёт, пока загрузится предыдущий; в state они попадают только
+    после загрузки. Пауза RELAX_TIME делается, только когда изменений нет.
+    """
+    timers = timers or [state.get_state(key) for key in timer_keys]
     while True:
-        timer_genres = state.get_state("timer_genres")
-        timer_persons = state.get_state("timer_persons")
-        timer_filmworks = state.get_state("timer_filmworks")
-        postgres_exporter = PostgresExtractor(pg_conn)
-        data_from_postgres, timers = postgres_exporter.extract_modified_data_persons(
-            timer_persons, timer_filmworks
-        )
-        transfer = DataTransform()
-        all_persons_elastic = transfer.persons_from_postgres_to_elastic(data_from_postgres)
-        if all_persons_elastic:
-            loader = ElasticsearchLoader()
-            loader.upload_to_elastic(all_persons_elastic, 'persons')
-            state.set_state("timer_persons", timers[0])
-            state.set_state("timer_filmworks", timers[1])
-        else:
+        rows, new_timers = extract(*timers)
+        if new_timers == timers:
             logging.info("Нет данных для обновления")
-        time.sleep(settings.RELAX_TIME)
+            wait_for_changes()
+            continue
+        timers = new_timers
+        yield rows, dict(zip(timer_keys, timers))
+
+
+def full_reindex_cycles(extractor: PostgresExtractor, query: str, extract, timer_keys: list[str]):
+    """Полная выгрузка одним потоковым проходом, затем обычные проходы.
+
+    Таймеры после полного прохода - время его начала: всё, что изменится
+    во время выгрузки, подхватят следующие проходы.
+    """
+    started = extractor.now()
+    timers = [[started, ZERO_ID] for _ in timer_keys]
+    yield extractor.stream(query), dict(zip(timer_keys, timers))
+    yield from extract_cycles(extract, timer_keys, timers)
+
+
+def commit_timers(timers: dict):
+    state.update(timers)
+
 
+def make_pipeline(transform, load, commit) -> Pipeline:
+    return Pipeline(
+        transform=transform,
+        load=load,
+        commit=commit,
+        transform_workers=settings.ETL_TRANSFORM_WORKERS,
+        load_workers=settings.ETL_LOAD_WORKERS,
+        queue_size=settings.ETL_QUEUE_SIZE,
+        chunk_size=settings.ETL_CHUNK_SIZE,
+    )
 
-def postgres_to_elastic_genres(pg_conn: _connection):
+
+def run_pipeline(extract, timer_keys: list[str], transform, index_name: str, cycles=None, commit=None):
+    commit = commit or commit_timers
+
+    def commit_and_warm(timers: dict):
+        commit(timers)
+        loader.request_warmup()
+
+    pipeline = make_pipeline(transform,
+                             lambda data: loader.upload_to_elastic(data, index_name),
+                             commit_and_warm)
+    pipeline.run(cycles or extract_cycles(extract, timer_keys))
+
+
+def postgres_to_elastic_movies(pg_conn: _connection, full: bool = False):
+    """Основной метод загрузки movies из Postgres в Elastic"""
+    extractor = PostgresExtractor(pg_conn)
+    timer_keys = ["timer_genres", "timer_persons", "timer_filmworks"]
+    cycles = None
+    if full:
+        cycles = full_reindex_cycles(extractor, ALL_MOVIES, extractor.extract_modified_data_movies, timer_keys)
+    run_pipeline(extractor.extract_modified_data_movies,
+                 timer_keys,
+                 DataTransform().movies_from_postgres_to_elastic,
+                 'movies',
+                 cycles)
+
+
+def postgres_to_elastic_persons(pg_conn: _connection, full: bool = False):
+    """Основной метод загрузки persons из Postgres в Elastic"""
+    extractor = PostgresExtractor(pg_conn)
+    timer_keys = ["timer_persons", "timer_filmworks"]
+    cycles = None
+    if full:
+        cycles = full_reindex_cycles(extractor, ALL_PERSONS, extractor.extract_modified_data_persons, timer_keys)
+    run_pipeline(extractor.extract_modified_data_persons,
+                 timer_keys,
+                 DataTransform().persons_from_postgres_to_elastic,
+                 'persons',
+                 cycles)
+
+
+def postgres_to_elastic_genres(pg_conn: _connection, full: bool = False):
     """Основной метод загрузки genres из Postgres в Elastic"""
-    while True:
-        timer_genres = state.get_state("timer_genres")
-        timer_persons = state.get_state("timer_persons")
-        timer_filmworks = state.get_state("timer_filmworks")
-        postgres_exporter = PostgresExtractor(pg_conn)
-        data_from_postgres, timers = postgres_exporter.extract_modified_data_genres(
-            timer_genres, timer_filmworks
-        )
-        transfer = DataTransform()
-        all_genres_elastic = transfer.genres_from_postgres_to_elastic(data_from_postgres)
-        if all_genres_elastic:
-            loader = ElasticsearchLoader()
-            loader.upload_to_elastic(all_genres_elastic, 'genres')
-            state.set_state("timer_genres", timers[0])
-            state.set_state("timer_filmworks", timers[1])
-        else:
+    extractor = PostgresExtractor(pg_conn)
+    timer_keys = ["timer_genres", "timer_filmworks"]
+    cycles = None
+    if full:
+        cycles = full_reindex_cycles(extractor, ALL_GENRES, extractor.extract_modified_data_genres, timer_keys)
+    run_pipeline(extractor.extract_modified_data_genres,
+                 timer_keys,
+                 DataTransform().genres_from_postgres_to_elastic,
+                 'genres',
+                 cycles)
+
+
+def detect_cycles(extractor: PostgresExtractor, feed: ChangeFeed, timers: dict, workers: list[threading.Thread]):
+    """Общий для всех индексов поиск изменений: один проход на цикл."""
+    while all(worker.is_alive() for worker in workers):
+        positions, ids = extractor.detect_changes(timers)
+        if positions == timers:
             logging.info("Нет данных для обновления")
-        time.sleep(settings.RELAX_TIME)
+            wait_for_changes()
+            continue
+        timers = positions
+        feed.publish(ChangeSet(positions, {key: frozenset(value) for key, value in ids.items()}))
+        logging.info("Ожидают загрузки: " + ", ".join(f"{name} {feed.lag(name)}" for name in SHARED_SOURCES))
+
+
+def shared_cycles(feed: ChangeFeed, name: str, extractor: PostgresExtractor):
+    """Проходы индекса по общему потоку изменений."""
+    query, timer_keys, _ = SHARED_SOURCES[name]
+    while (changes := feed.take(name)) is not None:
+        params = tuple(tuple(changes.ids[key]) for key in timer_keys)
+        yield extractor.stream(query, params), {key: changes.positions[key] for key in timer_keys}
+
+
+def postgres_to_elastic_all(pg_conn: _connection, states: dict[str, State]):
+    """Загрузка всех индексов одним процессом из общего набора изменений.
+
+    У каждого индекса свой поток, соединение с Postgres и свой прогресс
+    в state; поиск изменений начинается с самой ранней позиции среди индексов.
+    """
+    feed = ChangeFeed(list(SHARED_SOURCES))
+    errors = []
+
+    def worker(name: str):
+        _, timer_keys, transform = SHARED_SOURCES[name]
+        try:
+            with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as index_conn:
+                run_pipeline(None, timer_keys, transform, name,
+                             cycles=shared_cycles(feed, name, PostgresExtractor(index_conn)),
+                             commit=states[name].update)
+        except BaseException as exc:
+            errors.append(exc)
+            raise
+
+    timers = {}
+    for key in TIMER_TABLES:
+        positions = [states[name].get_state(key) for name, (_, keys, _) in SHARED_SOURCES.items() if key in keys]
+        timers[key] = min(positions, key=lambda position: (datetime.fromisoformat(position[0]), position[1]))
+
+    workers = [threading.Thread(target=worker, args=(name,), name=f'etl-{name}', daemon=True)
+               for name in SHARED_SOURCES]
+    for thread in workers:
+        thread.start()
+    try:
+        detect_cycles(PostgresExtractor(pg_conn), feed, timers, workers)
+    finally:
+        feed.close()
+        for thread in workers:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+
+def postgres_to_elastic_backfill(pg_conn: _connection, name: str, index_state: State):
+    """Полная загрузка индекса в новую версию с переключением алиаса.
+
+    Пока идёт загрузка, API читает прежний индекс через алиас name; алиас
+    переключается на новую версию только когда она полностью загружена,
+    слита и доступна для поиска. Таймеры индекса после этого - время
+    начала загрузки: изменения за время загрузки подхватят обычные проходы.
+    """
+    query, schema = BACKFILL_SOURCES[name]
+    _, timer_keys, transform = SHARED_SOURCES[name]
+    extractor = PostgresExtractor(pg_conn)
+    started = extractor.now()
+    index = loader.create_backfill_index(name, schema)
+    logging.info(f"Полная загрузка {name} в индекс {index}")
+    pipeline = make_pipeline(transform,
+                             # Пока алиас не переключён, API новую версию не читает: сбрасывать кеш рано
+                             lambda data: loader.upload_to_elastic(data, index, skip_unchanged=False, publish=False),
+                             lambda _: None)
+    pipeline.run([(extractor.stream(query), None)])
+    loader.finish_backfill(name, index, schema)
+    index_state.update({key: [started, ZERO_ID] for key in timer_keys})
+    logging.info(f"Алиас {name} переключён на {index}")
 
 
 def backoff_hdlr(details):
     logging.info(f"backoff_hdlr, {details}")
 
 
+# Ошибки Redis здесь - от хранилищ состояния и хешей в Redis (STATE_STORAGE,
+# CONTENT_HASH_STORAGE); публикация сброса кеша API их не пропускает
 backoff_etl = backoff.on_exception(backoff.expo, (
                           psycopg2.OperationalError,
                           psycopg2.InterfaceError,
-                          ElasticConnectionError
+                          ElasticConnectionError,
+                          RedisConnectionError,
+                          RedisTimeoutError,
                           ),
                       max_value=10,
                       on_backoff=backoff_hdlr)
 
 
 @backoff_etl
-def run_etl_movies():
+def run_etl_movies(full: bool = False):
     with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as pg_conn:
-        postgres_to_elastic_movies(pg_conn)
+        postgres_to_elastic_movies(pg_conn, full)
 
 
 @backoff_etl
-def run_etl_persons():
+def run_etl_persons(full: bool = False):
     with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as pg_conn:
-        postgres_to_elastic_persons(pg_conn)
+        postgres_to_elastic_persons(pg_conn, full)
 
 
 @backoff_etl
-def run_etl_genres():
+def run_etl_genres(full: bool = False):
     with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as pg_conn:
-        postgres_to_elastic_genres(pg_conn)
+        postgres_to_elastic_genres(pg_conn, full)
 
 
-def create_schema(index: str, body: str):
-    try:
-        es.indices.create(index=index, body=body)
-        logging.info(f"Индекс {index} создан")
-    except:
-        logging.info(f"Индекс {index} уже существует")
+@backoff_etl
+def run_etl_all(states: dict[str, State]):
+    with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as pg_conn:
+        postgres_to_elastic_all(pg_conn, states)
+
+
+@backoff_etl
+def run_backfill(states: dict[str, State]):
+    with closing(psycopg2.connect(**settings.dsl, cursor_factory=DictCursor)) as pg_conn:
+        for name, index_state in states.items():
+            postgres_to_elastic_backfill(pg_conn, name, index_state)
+
+
+def create_storage(namespace: str) -> BaseStorage:
+    """Хранилище состояния процесса; у каждого процесса своё пространство имён."""
+    if settings.STATE_STORAGE == 'redis':
+        return RedisStorage(Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT), namespace)
+    if settings.STATE_STORAGE == 'postgres':
+        state_conn = psycopg2.connect(**settings.dsl)
+        state_conn.autocommit = True
+        return PostgresStorage(state_conn, namespace)
+    # state.json - файл состояния прежних версий, в контейнере каждого процесса свой
+    return JsonFileStorage(settings.STATE_FILE.format(namespace=namespace), legacy_path="state.json")
+
+
+def create_hash_index(namespace: str) -> HashIndex | None:
+    if settings.CONTENT_HASH_STORAGE == 'redis':
+        return RedisHashIndex(Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT))
+    if settings.CONTENT_HASH_STORAGE == 'sqlite':
+        return SqliteHashIndex(settings.CONTENT_HASH_FILE.format(namespace=namespace))
+    return None
+
+
+def create_publisher() -> CachePublisher | None:
+    if not settings.CACHE_INVALIDATION_ENABLED:
+        return None
+    return CachePublisher(Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT),
+                          settings.CACHE_INVALIDATION_STREAM, settings.CACHE_INVALIDATION_MAXLEN)
+
+
+def open_state(namespace: str) -> State:
+    state = State(create_storage(namespace))
+    # Начальные таймеры только для пустого состояния, чтобы перезапуск продолжал с места остановки
+    defaults = {
+        "timer_genres": [settings.TIMER_GENRES, ZERO_ID],
+        "timer_persons": [settings.TIMER_PERSONS, ZERO_ID],
+        "timer_filmworks": [settings.TIMER_FILMWORKS, ZERO_ID],
+    }
+    missing = {key: value for key, value in defaults.items() if state.get_state(key) is None}
+    if missing:
+        state.update(missing)
+    return state
 
 
 if __name__ == "__main__":
-    storage = JsonFileStorage("state.json")
-    state = State(storage)
-    state.set_state("timer_genres", settings.TIMER_GENRES)
-    state.set_state("timer_persons", settings.TIMER_PERSONS)
-    state.set_state("timer_filmworks", settings.TIMER_FILMWORKS)
-    es = Elasticsearch(f'http://{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}')
-    
     parser = argparse.ArgumentParser()
-    parser.add_argument('-o', type=str, choices=['movies', 'persons', 'genres'], help='тип объекта для загрузки')
+    parser.add_argument('-o', type=str, choices=['movies', 'persons', 'genres', 'all'], help='тип объекта для загрузки')
+    parser.add_argument('--full', action='store_true', help='сначала выгрузить все записи потоково')
+    parser.add_argument('--backfill', action='store_true',
+                        help='загрузить всё в новую версию индекса и переключить на неё алиас')
     args = parser.parse_args()
-    if args.o:
+    if args.o == 'all' and args.full:
+        parser.error('--full поддерживается только для одного индекса')
+    if args.full and args.backfill:
+        parser.error('--full и --backfill взаимоисключающие')
+
+    loader = ElasticsearchLoader(create_hash_index(args.o or 'etl'), create_publisher())
+    if args.o == 'all':
+        # Прогресс каждого индекса хранится там же, где у отдельного процесса этого индекса
+        states = {name: open_state(name) for name in SHARED_SOURCES}
+        if args.backfill:
+            run_backfill(states)
+        loader.create_index("movies", schema_movies)
+        loader.create_index("persons", schema_persons)
+        loader.create_index("genres", schema_genres)
+        run_etl_all(states)
+    elif args.o:
+        state = open_state(args.o)
+        if args.backfill:
+            run_backfill({args.o: state})
         if args.o == 'movies':
-            create_schema("movies", schema_movies)
-            run_etl_movies()
+            loader.create_index("movies", schema_movies)
+            run_etl_movies(args.full)
         elif args.o == 'persons':
-            create_schema("persons", schema_persons)
-            run_etl_persons()
+            loader.create_index("persons", schema_persons)
+            run_etl_persons(args.full)
         elif args.o == 'genres':
-            create_schema("genres", schema_genres)
-            run_etl_genres()
-    es.transport.close()
+            loader.create_index("genres", schema_genres)
+            run_etl_genres(args.full)
+    loader.close()
 
@@ -1,13 +1,13 @@
 SQL_LAST_INSERTED_PERSONS = f"SELECT id, modified " \
                             f"FROM content.person " \
-                            f"WHERE modified > %s " \
-                            f"ORDER BY modified " \
+                            f"WHERE (modified, id) > (%s, %s) " \
+                            f"ORDER BY modified, id " \
                             f"LIMIT %s;"
 
 SQL_LAST_INSERTED_GENRES = f"SELECT id, modified " \
                            f"FROM content.genre " \
-                           f"WHERE modified > %s " \
-                           f"ORDER BY modified " \
+                           f"WHERE (modified, id) > (%s, %s) " \
+                           f"ORDER BY modified, id " \
                            f"LIMIT %s;"
 
 SQL_MOVIES_WHERE_PERSON = f"SELECT fw.id " \
@@ -35,13 +35,13 @@ SQL_GENRES_WHERE_MOVIE = f"SELECT g.id " \
 
 SQL_LAST_INSERTED_TIME_FILMWORKS = f"SELECT id, modified " \
                                    f"FROM content.film_work " \
-                                   f"WHERE modified > %s " \
-                                   f"ORDER BY modified " \
+                                   f"WHERE (modified, id) > (%s, %s) " \
+                                   f"ORDER BY modified, id " \
                                    f"LIMIT %s"
 
 UNION_PERSON_GENRES = f"({SQL_MOVIES_WHERE_PERSON}) UNION ({SQL_MOVIES_WHERE_GENRE})"
 
-ALL_MODIFIED_MOVIES = f"SELECT " \
+SELECT_MOVIES = f"SELECT " \
                       f"fw.id as fw_id, " \
                       f"fw.title, " \
                       f"fw.description, " \
@@ -60,11 +60,15 @@ ALL_MODIFIED_MOVIES = f"SELECT " \
                       f"LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id " \
                       f"LEFT JOIN content.person p ON p.id = pfw.person_id " \
                       f"LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id " \
-                      f"LEFT JOIN content.genre g ON g.id = gfw.genre_id " \
+                      f"LEFT JOIN content.genre g ON g.id = gfw.genre_id "
+
+ALL_MODIFIED_MOVIES = f"{SELECT_MOVIES}" \
                       f"WHERE fw.id IN ({UNION_PERSON_GENRES}) OR fw.id IN %s " \
                       f"GROUP BY fw.id;"
 
-ALL_MODIFIED_PERSONS = f"SELECT " \
+ALL_MOVIES = f"{SELECT_MOVIES}GROUP BY fw.id;"
+
+SELECT_PERSONS = f"SELECT " \
                       f"p.id as p_id, " \
                       f"p.full_name, " \
                       f"COALESCE (" \
@@ -79,15 +83,28 @@ ALL_MODIFIED_PERSONS = f"SELECT " \
                           f"'[]') as films " \
                       f"FROM content.person p " \
                       f"LEFT JOIN content.person_film_work pfw ON pfw.person_id = p.id " \
-                      f"LEFT JOIN content.film_work fw ON fw.id = pfw.film_work_id " \
-                      f"WHERE p.id IN ({SQL_PERSONS_WHERE_MOVIE}) OR p.id IN %s " \
-                      f"GROUP BY p.id;"
+                      f"LEFT JOIN content.film_work fw ON fw.id = pfw.film_work_id "
+
+ALL_MODIFIED_PERSONS = f"{SELECT_PERSONS}" \
+                       f"WHERE p.id IN ({SQL_PERSONS_WHERE_MOVIE}) OR p.id IN %s " \
+                       f"GROUP BY p.id;"
+
+ALL_PERSONS = f"{SELECT_PERSONS}GROUP BY p.id;"
 
-ALL_MODIFIED_GENRES = f"SELECT " \
+SELECT_GENRES = f"SELECT " \
                       f"g.id as g_id, " \
                       f"g.name " \
                       f"FROM content.genre g " \
                       f"LEFT JOIN content.genre_film_work gfw ON gfw.genre_id = g.id " \
-                      f"LEFT JOIN content.film_work fw ON fw.id = gfw.film_work_id " \
+                      f"LEFT JOIN content.film_work fw ON fw.id = gfw.film_work_id "
+
+ALL_MODIFIED_GENRES = f"{SELECT_GENRES}" \
                       f"WHERE g.id IN ({SQL_GENRES_WHERE_MOVIE}) OR g.id IN %s " \
-                      f"GROUP BY g.id;"
\ No newline at end of file
+                      f"GROUP BY g.id;"
+
+ALL_GENRES = f"{SELECT_GENRES}GROUP BY g.id;"
+
+SQL_NOW = "SELECT now();"
+
+# Начальный id позиции (modified, id): меньше любого uuid
+ZERO_ID = "00000000-0000-0000-0000-000000000000"
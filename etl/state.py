@@ -1,6 +1,8 @@
 import abc
 import json
 import os
+import tempfile
+import threading
 from typing import Any, Dict
 
 
@@ -25,40 +27,115 @@ class BaseStorage(abc.ABC):
 class JsonFileStorage(BaseStorage):
     """Реализация хранилища, использующего локальный файл.
 
-    Формат хранения: JSON
+    Формат хранения: JSON. Файл перезаписывается атомарно: состояние
+    пишется во временный файл рядом и подменяет старый через rename,
+    поэтому падение посреди записи не оставляет обрезанный файл.
+
+    Пока файла нет, состояние читается из legacy_path, если он задан:
+    так подхватывается файл прежнего формата имени, а следующая запись
+    уже идёт в file_path.
     """
 
-    def __init__(self, file_path: str) -> None:
+    def __init__(self, file_path: str, legacy_path: str | None = None) -> None:
         self.file_path = file_path
+        self.legacy_path = legacy_path
 
     def save_state(self, state: Dict[str, Any]) -> None:
         """Сохранить состояние в хранилище."""
-        with open(self.file_path, 'w') as file:
-            json.dump(state, file)
+        directory = os.path.dirname(os.path.abspath(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(state, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
     def retrieve_state(self) -> Dict[str, Any]:
         """Получить состояние из хранилища."""
-        if os.path.isfile(self.file_path):
-            with open(self.file_path, 'r') as file:
-                return json.load(file)
+        for path in (self.file_path, self.legacy_path):
+            if path and os.path.isfile(path):
+                with open(path, 'r') as file:
+                    return json.load(file)
         return {}
 
 
+class RedisStorage(BaseStorage):
+    """Хранилище в Redis: состояние процесса - JSON под ключом его пространства имён."""
+
+    def __init__(self, redis, namespace: str) -> None:
+        self.redis = redis
+        self.key = f'etl:state:{namespace}'
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """Сохранить состояние в хранилище."""
+        self.redis.set(self.key, json.dumps(state))
+
+    def retrieve_state(self) -> Dict[str, Any]:
+        """Получить состояние из хранилища."""
+        data = self.redis.get(self.key)
+        return json.loads(data) if data else {}
+
+
+class PostgresStorage(BaseStorage):
+    """Хранилище в Postgres: строка таблицы etl_state на пространство имён.
+
+    Соединение должно быть отдельным от соединения выгрузки и в режиме
+    autocommit, чтобы сохранение не зависело от её транзакций.
+    """
+
+    def __init__(self, pg_conn, namespace: str) -> None:
+        self.connect = pg_conn
+        self.namespace = namespace
+        with self.connect.cursor() as cursor:
+            cursor.execute("CREATE TABLE IF NOT EXISTS etl_state ("
+                           "namespace TEXT PRIMARY KEY, "
+                           "state JSONB NOT NULL, "
+                           "modified TIMESTAMP WITH TIME ZONE DEFAULT now());")
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        """Сохранить состояние в хранилище."""
+        with self.connect.cursor() as cursor:
+            cursor.execute("INSERT INTO etl_state (namespace, state) VALUES (%s, %s) "
+                           "ON CONFLICT (namespace) DO UPDATE SET state = EXCLUDED.state, modified = now();",
+                           (self.namespace, json.dumps(state)))
+
+    def retrieve_state(self) -> Dict[str, Any]:
+        """Получить состояние из хранилища."""
+        with self.connect.cursor() as cursor:
+            cursor.execute("SELECT state FROM etl_state WHERE namespace = %s;", (self.namespace,))
+            row = cursor.fetchone()
+        return row[0] if row else {}
+
+
 class State:
-    """Класс для работы с состояниями."""
+    """Класс для работы с состояниями.
+
+    Состояние читается из хранилища один раз и дальше живёт в памяти;
+    в хранилище уходит только запись. Методы можно вызывать из разных
+    потоков конвейера.
+    """
 
     def __init__(self, storage: BaseStorage) -> None:
         self.storage = storage
+        self._lock = threading.Lock()
+        self._data = storage.retrieve_state()
 
     def set_state(self, key: str, value: Any) -> None:
         """Установить состояние для определённого ключа."""
-        data = self.storage.retrieve_state()
-        data[key] = value
-        self.storage.save_state(data)
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Установить несколько ключей и сохранить их одной записью."""
+        with self._lock:
+            data = {**self._data, **values}
+            self.storage.save_state(data)
+            self._data = data
 
     def get_state(self, key: str) -> Any:
         """Получить состояние по определённому ключу."""
-        data = self.storage.retrieve_state()
-        if key in data:
-            return data[key]
-        return None
+        with self._lock:
+            return self._data.get(key)
@@ -0,0 +1,6 @@
+import os
+
+# Настройки ETL без .env: Postgres из .env.example на локальной машине
+os.environ.setdefault('POSTGRES_DB', 'movies_database')
+os.environ.setdefault('POSTGRES_USER', 'app')
+os.environ.setdefault('POSTGRES_PASSWORD', '123qwe')
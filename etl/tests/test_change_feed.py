@@ -0,0 +1,57 @@
+import threading
+
+from change_feed import ChangeFeed, ChangeSet
+
+
+def changes(position, **ids):
+    return ChangeSet(positions={key: [position] for key in ids},
+                     ids={key: frozenset(values) for key, values in ids.items()})
+
+
+def test_every_subscriber_gets_published_changes():
+    feed = ChangeFeed(['movies', 'persons'])
+    feed.publish(changes(1, film_work={'a', 'b'}))
+
+    assert feed.take('movies') == changes(1, film_work={'a', 'b'})
+    assert feed.take('persons') == changes(1, film_work={'a', 'b'})
+    assert feed.lag('movies') == feed.lag('persons') == 0
+
+
+def test_lagging_subscriber_gets_merged_changes():
+    feed = ChangeFeed(['movies', 'persons'])
+    feed.publish(changes(1, film_work={'a'}, person={'p'}))
+    assert feed.take('movies') == changes(1, film_work={'a'}, person={'p'})
+    feed.publish(changes(2, film_work={'a', 'b'}))
+
+    assert feed.lag('persons') == 3
+    assert feed.take('persons') == ChangeSet(positions={'film_work': [2], 'person': [1]},
+                                             ids={'film_work': frozenset({'a', 'b'}), 'person': frozenset({'p'})})
+    assert feed.take('movies') == changes(2, film_work={'a', 'b'})
+
+
+def test_take_waits_for_publish():
+    feed = ChangeFeed(['movies'])
+    taken = []
+    thread = threading.Thread(target=lambda: taken.append(feed.take('movies')))
+    thread.start()
+    thread.join(0.1)
+    assert thread.is_alive()
+
+    feed.publish(changes(1, genre={'g'}))
+    thread.join(1)
+
+    assert taken == [changes(1, genre={'g'})]
+
+
+def test_close_releases_waiting_subscribers():
+    feed = ChangeFeed(['movies', 'genres'])
+    taken = []
+    threads = [threading.Thread(target=lambda name=name: taken.append(feed.take(name))) for name in ['movies', 'genres']]
+    for thread in threads:
+        thread.start()
+
+    feed.close()
+    for thread in threads:
+        thread.join(1)
+
+    assert taken == [None, None]
@@ -0,0 +1,51 @@
+import pytest
+
+from content_hash import RedisHashIndex, SqliteHashIndex, document_hash
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def hashes(request, tmp_path):
+    if request.param == 'sqlite':
+        index = SqliteHashIndex(str(tmp_path / 'hashes.sqlite'))
+        yield index
+        index.connect.close()
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        yield RedisHashIndex(fakeredis.FakeRedis())
+
+
+def test_document_hash_ignores_key_order():
+    assert document_hash({'id': '1', 'title': 'A'}) == document_hash({'title': 'A', 'id': '1'})
+    assert document_hash({'id': '1', 'title': 'A'}) != document_hash({'id': '1', 'title': 'B'})
+
+
+def test_unchanged_documents_skipped(hashes):
+    documents = [{'id': '1', 'title': 'A'}, {'id': '2', 'title': 'B'}]
+    changed, new_hashes = hashes.changed('movies', documents)
+    assert changed == documents
+    hashes.save_many('movies', new_hashes)
+
+    changed, new_hashes = hashes.changed('movies', [{'id': '1', 'title': 'A'}, {'id': '2', 'title': 'C'}])
+
+    assert changed == [{'id': '2', 'title': 'C'}]
+    assert new_hashes == {'2': document_hash({'id': '2', 'title': 'C'})}
+
+
+def test_indexes_are_separate_and_clear_resets_one(hashes):
+    documents = [{'id': '1', 'title': 'A'}]
+    hashes.save_many('movies', hashes.changed('movies', documents)[1])
+    hashes.save_many('persons', hashes.changed('persons', documents)[1])
+
+    hashes.clear('movies')
+
+    assert hashes.changed('movies', documents)[0] == documents
+    assert hashes.changed('persons', documents)[0] == []
+
+
+def test_many_ids(hashes):
+    documents = [{'id': str(number), 'title': 'A'} for number in range(2000)]
+    hashes.save_many('movies', hashes.changed('movies', documents)[1])
+
+    assert hashes.get_many('movies', [str(number) for number in range(2000)]).keys() == {
+        str(number) for number in range(2000)}
+    assert hashes.changed('movies', documents) == ([], {})
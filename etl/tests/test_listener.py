@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from config import settings  # noqa: E402
+from listener import ChangeListener  # noqa: E402
+
+
+@pytest.fixture
+def listener():
+    try:
+        listener = ChangeListener(settings.dsl, settings.ETL_NOTIFY_CHANNEL, debounce=0.2)
+    except psycopg2.OperationalError:
+        pytest.skip('Postgres недоступен')
+    yield listener
+    listener.close()
+
+
+@pytest.fixture
+def connection(listener):
+    connection = psycopg2.connect(**settings.dsl)
+    connection.autocommit = True
+    yield connection
+    connection.close()
+
+
+def test_wait_times_out_without_changes(listener):
+    started = time.monotonic()
+
+    assert listener.wait(0.2) == set()
+    assert time.monotonic() - started >= 0.2
+
+
+def test_notify_wakes_listener(listener, connection):
+    with connection.cursor() as cursor:
+        # Триггер на оператор срабатывает и без изменённых строк
+        cursor.execute('UPDATE content.genre SET name = name WHERE false;')
+        cursor.execute('UPDATE content.person SET full_name = full_name WHERE false;')
+    started = time.monotonic()
+
+    assert listener.wait(5) == {'genre', 'person'}
+    assert time.monotonic() - started < 5
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Pipeline
+
+
+def cycles(*sizes):
+    return [(list(range(size)), f'checkpoint-{number}') for number, size in enumerate(sizes)]
+
+
+def test_all_rows_loaded_and_commits_in_order():
+    loaded = []
+    commits = []
+    lock = threading.Lock()
+
+    def load(documents):
+        # Первые пачки прохода грузятся дольше последних
+        time.sleep(0.01 * (3 - documents[0] // 10 % 3))
+        with lock:
+            loaded.extend(documents)
+
+    pipeline = Pipeline(transform=lambda rows: rows, load=load, commit=commits.append,
+                        transform_workers=2, load_workers=3, queue_size=2, chunk_size=10)
+    pipeline.run(cycles(30, 25, 40))
+
+    assert commits == ['checkpoint-0', 'checkpoint-1', 'checkpoint-2']
+    assert sorted(loaded) == sorted(list(range(30)) + list(range(25)) + list(range(40)))
+
+
+def test_checkpoint_committed_after_all_its_chunks_loaded():
+    events = []
+    lock = threading.Lock()
+
+    def load(documents):
+        time.sleep(0.01)
+        with lock:
+            events.append(('load', len(documents)))
+
+    def commit(checkpoint):
+        with lock:
+            events.append(('commit', checkpoint))
+
+    pipeline = Pipeline(transform=lambda rows: rows, load=load, commit=commit,
+                        load_workers=4, chunk_size=5)
+    pipeline.run(cycles(20, 5))
+
+    assert events == [('load', 5)] * 4 + [('commit', 'checkpoint-0'), ('load', 5), ('commit', 'checkpoint-1')]
+
+
+def test_empty_cycle_is_committed():
+    commits = []
+    loaded = []
+
+    pipeline = Pipeline(transform=lambda rows: rows, load=loaded.append, commit=commits.append)
+    pipeline.run([([], 'empty'), ([1], 'one')])
+
+    assert commits == ['empty', 'one']
+    assert loaded == [[1]]
+
+
+def test_transform_error_stops_pipeline_without_commit():
+    commits = []
+
+    def transform(rows):
+        if 'bad' in rows:
+            raise ValueError('bad row')
+        return rows
+
+    pipeline = Pipeline(transform=transform, load=lambda documents: None, commit=commits.append,
+                        transform_workers=2, chunk_size=1)
+    with pytest.raises(ValueError, match='bad row'):
+        pipeline.run([(['a', 'b'], 'first'), (['c', 'bad', 'd'], 'second'), (['e'], 'third')])
+
+    assert commits == ['first']
+
+
+def test_load_error_stops_pipeline_without_commit():
+    commits = []
+    extracted = []
+
+    def load(documents):
+        raise ConnectionError('elastic is down')
+
+    def rows():
+        for row in range(100):
+            extracted.append(row)
+            yield row
+
+    pipeline = Pipeline(transform=lambda rows: rows, load=load, commit=commits.append,
+                        queue_size=1, chunk_size=1)
+    with pytest.raises(ConnectionError, match='elastic is down'):
+        pipeline.run([(rows(), 'first'), ([1], 'second')])
+
+    assert commits == []
+    # Извлечение остановилось, не дочитав проход до конца
+    assert len(extracted) < 100
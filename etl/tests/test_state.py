@@ -0,0 +1,75 @@
+import json
+import os
+
+import pytest
+
+from state import BaseStorage, JsonFileStorage, RedisStorage, State
+
+
+class FailingStorage(BaseStorage):
+    def save_state(self, state):
+        raise OSError('disk full')
+
+    def retrieve_state(self):
+        return {'timer': 'old'}
+
+
+def test_json_storage_missing_file_is_empty(tmp_path):
+    assert JsonFileStorage(str(tmp_path / 'state.json')).retrieve_state() == {}
+
+
+def test_json_storage_round_trip_without_temp_files(tmp_path):
+    path = tmp_path / 'state.json'
+    storage = JsonFileStorage(str(path))
+
+    storage.save_state({'timer': '2021-06-16', 'position': [1, 'id']})
+    storage.save_state({'timer': '2021-06-17'})
+
+    assert storage.retrieve_state() == {'timer': '2021-06-17'}
+    assert json.loads(path.read_text()) == {'timer': '2021-06-17'}
+    assert os.listdir(tmp_path) == ['state.json']
+
+
+def test_json_storage_falls_back_to_legacy_file(tmp_path):
+    legacy = tmp_path / 'state.json'
+    legacy.write_text(json.dumps({'timer': '2021-06-16'}))
+    storage = JsonFileStorage(str(tmp_path / 'state_movies.json'), legacy_path=str(legacy))
+
+    assert storage.retrieve_state() == {'timer': '2021-06-16'}
+    storage.save_state({'timer': '2021-06-17'})
+
+    assert storage.retrieve_state() == {'timer': '2021-06-17'}
+    assert json.loads(legacy.read_text()) == {'timer': '2021-06-16'}
+
+
+def test_state_persists_between_instances(tmp_path):
+    path = str(tmp_path / 'state.json')
+    state = State(JsonFileStorage(path))
+    state.set_state('timer', '2021-06-16')
+    state.update({'position': [1, 'id'], 'timer': '2021-06-17'})
+
+    restored = State(JsonFileStorage(path))
+
+    assert restored.get_state('timer') == '2021-06-17'
+    assert restored.get_state('position') == [1, 'id']
+    assert restored.get_state('missing') is None
+
+
+def test_state_keeps_previous_values_when_save_fails():
+    state = State(FailingStorage())
+
+    with pytest.raises(OSError):
+        state.set_state('timer', 'new')
+
+    assert state.get_state('timer') == 'old'
+
+
+def test_redis_storage_namespaces():
+    fakeredis = pytest.importorskip('fakeredis')
+    redis = fakeredis.FakeRedis()
+    movies = State(RedisStorage(redis, 'movies'))
+    movies.set_state('timer', '2021-06-16')
+
+    assert State(RedisStorage(redis, 'movies')).get_state('timer') == '2021-06-16'
+    assert State(RedisStorage(redis, 'persons')).get_state('timer') is None
+    assert json.loads(redis.get('etl:state:movies')) == {'timer': '2021-06-16'}
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+from typing import Awaitable
+
+from fastapi import HTTPException, Response
+
+from services.cursor import InvalidCursorError, decode_cursor
+
+
+async def cursor_page(page: Awaitable[tuple[list, str | None]],
+                      response: Response,
+                      cursor: str,
+                      consistent: bool,
+                      detail: str) -> dict:
+    """Ответ курсорной выдачи: элементы страницы и курсор следующей."""
+    try:
+        items, next_cursor = await page
+        pit_id = decode_cursor(cursor)[1]
+    except InvalidCursorError as exc:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(exc))
+    if consistent or pit_id:
+        # Страницы внутри point in time одноразовые, кешировать их незачем
+        response.headers['Cache-Control'] = 'no-store'
+    if not items and not cursor:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=detail)
+    return {'items': items, 'next_cursor': next_cursor}
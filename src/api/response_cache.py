@@ -0,0 +1,78 @@
+import time
+from typing import Callable
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from core.config import settings
+from db.redis import get_redis
+from services.cache import get_cache, response_cache_key, response_scope
+from services.codec import BytesCodec
+from services.helper import AsyncCache
+
+# Тело ответа хранится с заголовком записи кеша: версия формата и момент окончания свежести
+RESPONSE_CODEC = BytesCodec()
+# Ключи ответов, которые воркер сейчас пересобирает до истечения
+_refreshing: set[str] = set()
+
+
+def request_cache_key(request: Request) -> str:
+    """Ключ по пути и отсортированным параметрам запроса."""
+    return response_cache_key(request.url.path, urlencode(sorted(request.query_params.multi_items())))
+
+
+class CachedResponseRoute(APIRoute):
+    """Маршрут, кеширующий готовое тело успешного JSON-ответа.
+
+    Тело кладётся в кеш уже после фильтрации через response_model,
+    пагинации и сортировки, поэтому при попадании отдаётся как есть,
+    без повторной валидации и сериализации. Тело живёт в кеше не дольше
+    данных, из которых собрано, и сбрасывается вместе с ними по тегам,
+    а собранное из устаревших данных (stale-while-revalidate) не
+    кешируется вовсе. Как и у записей сервисов, срок жизни ответа зависит
+    от частоты обращений, а горячий ответ пересобирается до истечения.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def cached_handler(request: Request) -> Response:
+            cache = get_cache(redis=await get_redis())
+            if not settings.redis_pipeline_reads:
+                return await cached_response(request, cache)
+            async with cache.pipelined():
+                return await cached_response(request, cache)
+
+        async def cached_response(request: Request, cache: AsyncCache) -> Response:
+            if request.method != 'GET' or not settings.response_cache_expire:
+                return await handler(request)
+
+            key = request_cache_key(request)
+            expire = cache.expire_for(key, settings.response_cache_expire)
+            data = await cache.get(key)
+            entry = RESPONSE_CODEC.decode(data) if data else None
+            if entry is not None:
+                fresh_until, body = entry
+                # Истекающий горячий ответ пересобирает один запрос воркера, остальные получают кеш
+                if key in _refreshing or not cache.refresh_due(key, fresh_until - time.time(), expire):
+                    return Response(content=body, media_type='application/json', headers={'X-Cache': 'HIT'})
+                _refreshing.add(key)
+
+            try:
+                with response_scope(key, refresh=entry is not None) as scope:
+                    response = await handler(request)
+            finally:
+                if entry is not None:
+                    _refreshing.discard(key)
+            if response.media_type != 'application/json':
+                return response
+            expire = int(min(expire, scope.fresh_until - time.time()))
+            if (response.status_code == 200 and expire > 0
+                    and 'no-store' not in response.headers.get('Cache-Control', '')):
+                await cache.set(key, RESPONSE_CODEC.encode(bytes(response.body), time.time() + expire), expire,
+                                tags=list(scope.tags))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+
+        return cached_handler
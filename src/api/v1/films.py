@@ -1,23 +1,36 @@
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from services.film import FilmService, get_film_service, Pagination
+from api.pagination import cursor_page
+from api.response_cache import CachedResponseRoute
+from core.config import settings
+from services.film import (FILM_FIELDS_PATTERN, FILM_SORT_PATTERN, FilmService, get_film_service, Pagination,
+                           parse_fields)
 
-from models.movies import Film
-from typing import List
+from models.base import CursorPage
+from models.movies import Film, FilmProjection
+from typing import List, Union
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
+
+FILMS_RESPONSE_MODEL = Union[List[Film], List[FilmProjection], CursorPage[Film], CursorPage[FilmProjection]]
 
 
 
 @router.get(
         '/search',
         summary="Find film by title",
-        response_model=List[Film])
+        response_model=FILMS_RESPONSE_MODEL,
+        response_model_exclude_unset=True)
 async def search_film(phrase: str,
+                      response: Response,
                       pagination: Pagination = Depends(),
+                      cursor: str = Query(None),
+                      consistent: bool = Query(False),
+                      fields: str = Query(None, pattern=FILM_FIELDS_PATTERN),
                       film_service: FilmService = Depends(get_film_service)
     ):
     """
@@ -25,12 +38,54 @@ async def search_film(phrase: str,
 
     - **phrase**: must be in the title
     - **pagination**: number of the page shown and number of items on the page
+    - **cursor**: switches to cursor pagination: pass an empty value for the first page,
+      then `next_cursor` of the previous response; `page` is ignored
+    - **consistent**: in cursor mode, walk a point-in-time snapshot of the index
+    - **fields**: comma-separated list of film fields to return, e.g. `title,imdb_rating`; `id` is always included
     """
-    films = await film_service.get_by_search(phrase, pagination.page, pagination.size)
+    fields = parse_fields(fields)
+    if cursor is not None:
+        return await cursor_page(
+            film_service.get_by_search_after(phrase, pagination.size, cursor, consistent, fields),
+            response, cursor, consistent, 'films not found')
+    films = await film_service.get_by_search(phrase, pagination.page, pagination.size, fields)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='films not found')
     return films
 
+@router.post(
+        '/batch',
+        summary="Find films by a list of IDs",
+        response_model=List[Film])
+async def films_batch(
+        film_ids: List[str] = Body(..., min_length=1, max_length=settings.batch_max_size),
+        film_service: FilmService = Depends(get_film_service)
+    ):
+    """
+    Find several films in one request
+
+    - **film_ids**: list of internal identificators of the films; unknown ones are skipped
+    """
+    films = await film_service.get_many(film_ids)
+    if not films:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='films not found')
+    return films
+
+@router.get(
+        '/export',
+        summary="Export the whole film catalog",
+        response_class=StreamingResponse)
+async def films_export(film_service: FilmService = Depends(get_film_service)):
+    """
+    Stream all films as newline-delimited JSON, one film per line.
+    Memory use does not depend on the size of the catalog.
+    """
+    async def lines():
+        async for film in film_service.export():
+            yield film.model_dump_json(by_alias=True) + '\n'
+
+    return StreamingResponse(lines(), media_type='application/x-ndjson')
+
 @router.get(
         '/{film_id}',
         summary="Find films by ID",
@@ -49,32 +104,41 @@ async def film_details(film_id: str, film_service: FilmService = Depends(get_fil
 
 @router.get(
         '/', 
-        summary="Find films by genre, title, sort by any field",
-        response_model=List[Film]
+        summary="Find films by genre, title, sort by rating or title",
+        response_model=FILMS_RESPONSE_MODEL,
+        response_model_exclude_unset=True
         )
 async def film_details(
-        sort: str = Query(None),
+        response: Response,
+        sort: str = Query(None, pattern=FILM_SORT_PATTERN),
         genre: str = Query(None),
         query: str = Query(None),
         pagination: Pagination = Depends(),
+        cursor: str = Query(None),
+        consistent: bool = Query(False),
+        fields: str = Query(None, pattern=FILM_FIELDS_PATTERN),
         film_service: FilmService = Depends(get_film_service)
     ):
     """
-    Find films by a genre, a phrase in the title, sort by any field:
-    - **sort**: a field in the Film model by which to sort
+    Find films by a genre, a phrase in the title, sort by rating or title:
+    - **sort**: a field by which to sort (imdb_rating or title), prefixed with "-" for descending order
     - **genre**: a genre of the film 
     - **query**: a phrase which must be in the title
     - **pagination**: number of the page shown and number of items on the page
+    - **cursor**: switches to cursor pagination: pass an empty value for the first page,
+      then `next_cursor` of the previous response; `page` is ignored
+    - **consistent**: in cursor mode, walk a point-in-time snapshot of the index
+    - **fields**: comma-separated list of film fields to return, e.g. `title,imdb_rating`; `id` is always included
     """
-    films = await film_service.get(genre=genre, title=query, page=pagination.page, size=pagination.size)
+    fields = parse_fields(fields)
+    if cursor is not None:
+        return await cursor_page(
+            film_service.get_after(genre, query, pagination.size, sort, cursor, consistent, fields),
+            response, cursor, consistent, 'films not found')
+    films = await film_service.get(genre=genre, title=query, page=pagination.page, size=pagination.size, sort=sort,
+                                   fields=fields)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='films not found')
-    if sort:
-        reverse_sort = False
-        if sort.startswith('-'):
-            reverse_sort = True
-            sort = sort[1:]  # Убираем знак минуса
-        films = sorted(films, key=lambda x: getattr(x, sort), reverse=reverse_sort)
     return films
 
 
@@ -1,11 +1,13 @@
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends, HTTPException
+from api.response_cache import CachedResponseRoute
+from core.config import settings
+from fastapi import APIRouter, Body, Depends, HTTPException
 from models.movies import Genre
 from services.genre import GenreService, get_genre_service
 from fastapi_pagination import Page, paginate
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
 
 
 @router.get('/{genre_id}',
@@ -18,6 +20,17 @@ async def genre_details(genre_id: str, genre_service: GenreService = Depends(get
     return genre
 
 
+@router.post('/batch',
+             response_model=list[Genre],
+             description="Give information about several genres by ids")
+async def genres_batch(genre_ids: list[str] = Body(..., min_length=1, max_length=settings.batch_max_size),
+                       genre_service: GenreService = Depends(get_genre_service)):
+    genres = await genre_service.get_many(genre_ids)
+    if not genres:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='genres not found')
+    return genres
+
+
 @router.get('/',
             response_model=Page[Genre],
             description="Give list of all genres")
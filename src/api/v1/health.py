@@ -1,7 +1,28 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+
+from services.cache import get_cache
+from services.helper import AsyncCache
+from services.invalidation import CacheInvalidator, get_invalidator
+from services.single_flight import SingleFlight, get_single_flight
+from services.warmup import CacheWarmer, get_warmer
 
 router = APIRouter()
 
 @router.get("/check")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@router.get("/cache")
+async def cache_stats(cache: AsyncCache = Depends(get_cache),
+                      single_flight: SingleFlight = Depends(get_single_flight),
+                      invalidator: CacheInvalidator = Depends(get_invalidator),
+                      warmer: CacheWarmer = Depends(get_warmer)):
+    """Cache statistics of the current worker"""
+    return {
+        'local': cache.stats(),
+        'hot_keys': cache.hot_keys(),
+        'single_flight': single_flight.stats(),
+        'invalidation': invalidator.stats(),
+        'warmup': warmer.stats(),
+    }
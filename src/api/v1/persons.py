@@ -1,12 +1,16 @@
 from http import HTTPStatus
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from api.pagination import cursor_page
+from api.response_cache import CachedResponseRoute
+from core.config import settings
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from models.base import CursorPage
 from pydantic import BaseModel, Field
 from services.person import PersonService, get_person_service, Pagination
 from fastapi_pagination import Page, paginate
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
 
 
 class SFilmsSearchPerson(BaseModel):
@@ -21,12 +25,21 @@ class SPersonSearch(BaseModel):
 
 
 @router.get('/search',
-            response_model=list[SPersonSearch],
+            response_model=list[SPersonSearch] | CursorPage[SPersonSearch],
             response_model_by_alias=False,
-            description="Search by person")
+            description="Search by person. Pass an empty `cursor` to switch to cursor pagination "
+                        "and then `next_cursor` of the previous response; "
+                        "`consistent` walks a point-in-time snapshot of the index")
 async def search_person(phrase: str,
+                        response: Response,
                         pagination: Pagination = Depends(),
+                        cursor: str = Query(None),
+                        consistent: bool = Query(False),
                         person_service: PersonService = Depends(get_person_service)):
+    if cursor is not None:
+        return await cursor_page(
+            person_service.get_by_search_after(phrase, pagination.size, cursor, consistent),
+            response, cursor, consistent, 'persons not found')
     persons = await person_service.get_by_search(phrase, pagination.page, pagination.size)
     if not persons:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='persons not found')
@@ -44,6 +57,17 @@ class SPerson(BaseModel):
     films: list[SFilmsPerson]
 
 
+@router.post('/batch',
+             response_model=list[SPerson],
+             description="Give information about several persons by ids")
+async def persons_batch(person_ids: list[str] = Body(..., min_length=1, max_length=settings.batch_max_size),
+                        person_service: PersonService = Depends(get_person_service)):
+    persons = await person_service.get_many(person_ids)
+    if not persons:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='persons not found')
+    return persons
+
+
 @router.get('/{person_id}',
             response_model=SPerson,
             description="Give information about person by id")
@@ -0,0 +1,98 @@
+"""Сравнение форматов записей кеша с прежним pickle пайдантик-моделей.
+
+Запуск из каталога src:
+
+    python -m benchmarks.cache_codec [--films 50] [--repeat 200]
+"""
+import argparse
+import asyncio
+import pickle
+import random
+import string
+import timeit
+import uuid
+
+from models.movies import Film
+from services.codec import CODECS, COMPRESSION_FLAGS
+from services.film import FilmService
+
+
+def random_words(count: int) -> str:
+    return ' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 10)))
+                    for _ in range(count))
+
+
+def random_persons(count: int) -> list[dict]:
+    return [{'id': str(uuid.uuid4()), 'name': random_words(2)} for _ in range(count)]
+
+
+def film_source() -> dict:
+    actors, writers, directors = random_persons(8), random_persons(3), random_persons(1)
+    return {
+        'id': str(uuid.uuid4()),
+        'title': random_words(3),
+        'imdb_rating': round(random.uniform(1, 10), 1),
+        'description': random_words(60),
+        'genres': random.sample(['Action', 'Drama', 'Comedy', 'Sci-Fi', 'Documentary'], 2),
+        'actors_names': [a['name'] for a in actors],
+        'writers_names': [w['name'] for w in writers],
+        'directors_names': [d['name'] for d in directors],
+        'actors': actors,
+        'writers': writers,
+        'directors': directors,
+    }
+
+
+def models_builder():
+    """Сборка моделей из закешированных `_source`, как это делает FilmService."""
+    service = FilmService.__new__(FilmService)
+    loop = asyncio.new_event_loop()
+
+    def build(sources: dict | list[dict]):
+        if isinstance(sources, dict):
+            return loop.run_until_complete(service._film_doc_to_model(sources))
+        return loop.run_until_complete(service._films_to_models(sources))
+    return build
+
+
+def measure(name: str, encode, decode, value, repeat: int):
+    data = encode(value)
+    encode_time = timeit.timeit(lambda: encode(value), number=repeat) / repeat
+    decode_time = timeit.timeit(lambda: decode(data), number=repeat) / repeat
+    print(f'{name:<28}{encode_time * 1e6:>12.1f}{decode_time * 1e6:>12.1f}{len(data):>12}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--films', type=int, default=50, help='фильмов в списочной записи')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    build_models = models_builder()
+    sources = [film_source() for _ in range(args.films)]
+    models = build_models(sources)
+
+    for title, source_value, model_value in (('single film', sources[0], models[0]),
+                                             (f'list of {args.films} films', sources, models)):
+        print(f'\n{title}')
+        print(f'{"codec":<28}{"encode, us":>12}{"decode, us":>12}{"bytes":>12}')
+        measure('pickle (models)', pickle.dumps, pickle.loads, model_value, args.repeat)
+        if isinstance(model_value, Film):
+            measure('pydantic json (model)', Film.model_dump_json, Film.model_validate_json,
+                    model_value, args.repeat)
+        for codec_name, codec_class in CODECS.items():
+            for compression in [None, *COMPRESSION_FLAGS]:
+                try:
+                    codec = codec_class(compression, compress_threshold=0)
+                except ValueError:
+                    continue
+                measure(f'{codec_name}+{compression or "raw"}', codec.encode, codec.decode,
+                        source_value, args.repeat)
+                if compression is None:
+                    measure(f'{codec_name}+raw (to models)', codec.encode,
+                            lambda data: build_models(codec.decode(data)[1]),
+                            source_value, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
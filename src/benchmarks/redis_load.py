@@ -0,0 +1,107 @@
+"""Задержка чтений из кеша под конкурентной нагрузкой: до и после настройки пула Redis.
+
+Каждый запрос читает ответ ручки, а при промахе - персону и несколько её
+фильмов одновременно, как сервис, которому нужны несколько ключей. Локальный
+уровень кеша отключён, чтобы каждое чтение шло в Redis.
+
+    before - Redis(host, port) с пулом по умолчанию, каждое чтение отдельным запросом
+    after  - пул из db.redis.create_pool() и чтения запроса через cache.pipelined()
+
+Запуск из каталога src при доступном Redis из настроек:
+
+    python -m benchmarks.redis_load [--concurrency 1 50 200] [--requests 5000] [--films 5]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.redis import create_pool
+from services.cache import LayeredCache, LocalCache
+from services.tags import TagIndex
+
+PREFIX = 'bench:'
+
+
+async def seed(redis: Redis, persons: list[str], films: int) -> dict[str, list[str]]:
+    person_films = {person: [PREFIX + str(uuid.uuid4()) for _ in range(films)] for person in persons}
+    async with redis.pipeline(transaction=False) as pipe:
+        for person, film_keys in person_films.items():
+            pipe.set(person, b'x' * 512, ex=600)
+            for key in film_keys:
+                pipe.set(key, b'x' * 2048, ex=600)
+        await pipe.execute()
+    return person_films
+
+
+async def request(cache: LayeredCache, person: str, film_keys: list[str], pipelined: bool):
+    async def read():
+        # Ответа ручки нет в кеше - читаем данные сервиса
+        await cache.get(PREFIX + 'response:' + person)
+        await asyncio.gather(cache.get(person), *(cache.get(key) for key in film_keys))
+
+    if pipelined:
+        async with cache.pipelined():
+            await read()
+    else:
+        await read()
+
+
+async def run(cache: LayeredCache, person_films: dict[str, list[str]], concurrency: int, requests: int,
+              pipelined: bool) -> tuple[list[float], float]:
+    persons = list(person_films)
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            person = persons[i % len(persons)]
+            started = time.perf_counter()
+            await request(cache, person, person_films[person], pipelined)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def report(name: str, concurrency: int, latencies: list[float], elapsed: float):
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f'{name:<8}{concurrency:>6}{len(latencies) / elapsed:>10.0f}'
+          f'{quantiles[49] * 1e3:>10.2f}{quantiles[94] * 1e3:>10.2f}{quantiles[98] * 1e3:>10.2f}')
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 50, 200])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--films', type=int, default=5, help='фильмов, читаемых вместе с персоной')
+    args = parser.parse_args()
+
+    clients = {
+        'before': Redis(host=settings.redis_host, port=settings.redis_port),
+        'after': Redis(connection_pool=create_pool()),
+    }
+    person_films = await seed(clients['after'], [PREFIX + str(uuid.uuid4()) for _ in range(100)], args.films)
+
+    print(f'{"setup":<8}{"conc":>6}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    try:
+        for concurrency in args.concurrency:
+            for name, redis in clients.items():
+                cache = LayeredCache(redis, LocalCache(0, 0), TagIndex(redis))
+                latencies, elapsed = await run(cache, person_films, concurrency, args.requests, name == 'after')
+                report(name, concurrency, latencies, elapsed)
+    finally:
+        keys = list(person_films) + [key for film_keys in person_films.values() for key in film_keys]
+        await clients['after'].delete(*keys)
+        for redis in clients.values():
+            await redis.aclose()
+            await redis.connection_pool.disconnect()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -5,8 +5,76 @@ class Settings(BaseSettings):
     project_name: str = 'movies'
     redis_host: str = '127.0.0.1'
     redis_port: int = 6379
+    # Пул соединений Redis: размер и сколько секунд ждать свободное соединение
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5
+    redis_socket_keepalive: bool = True
+    redis_socket_connect_timeout: float = 2
+    # Проверять PING соединение, простаивавшее дольше стольких секунд
+    redis_health_check_interval: int = 30
+    # Путь к unix-сокету вместо host/port, если Redis на той же машине
+    redis_unix_socket: str | None = None
+    # Чтения из кеша, сделанные одновременно в рамках запроса, уходят одним пайплайном
+    redis_pipeline_reads: bool = True
     elastic_host: str = '127.0.0.1'
     elastic_port: int = 9200
+    # Локальный (в памяти воркера) уровень кеша перед Redis
+    local_cache_max_size: int = 1024
+    local_cache_ttl: int = 60
+    # Межворкерная блокировка при перестроении значения в кеше
+    cache_lock_enabled: bool = False
+    cache_lock_timeout: float = 10
+    cache_lock_wait: float = 5
+    # Сколько секунд после истечения TTL отдавать устаревшее значение,
+    # обновляя его в фоне (0 - отключить stale-while-revalidate)
+    cache_stale_ttl: int = 60
+    # Формат записей в кеше: orjson | msgpack, сжатие: zlib | zstd | lz4
+    cache_codec: str = 'orjson'
+    cache_compression: str | None = None
+    cache_compress_threshold: int = 16 * 1024
+    # Предел времени жизни (сек) списков и поисков без фильтра по жанру, даже
+    # горячих: теги сбрасывают их при изменении попавших в выдачу документов,
+    # но не когда в выдачу входит новый документ
+    cache_list_max_expire: int = 60
+    # Кеш готовых JSON-ответов ручек (0 - отключить)
+    response_cache_expire: int = 60 * 5
+    # Максимальное число идентификаторов в пакетных ручках
+    batch_max_size: int = 100
+    # Время жизни point in time между страницами курсорной выдачи
+    pit_keep_alive: str = '1m'
+    # Размер пачки при полном обходе индекса (выгрузка, список всех жанров)
+    scan_batch_size: int = 1000
+    # Поток Redis, куда ETL пишет id записанных документов, и за сколько
+    # секунд перечитывать его при старте воркера (не меньше TTL кеша)
+    cache_invalidation_enabled: bool = True
+    cache_invalidation_stream: str = 'cache:invalidate'
+    cache_invalidation_replay: int = 60 * 60
+    # Как часто (сек) убирать из множеств тегов ключи истёкших записей
+    cache_tag_compaction_interval: int = 10 * 60
+    # Частота обращений к ключам (count-min sketch на воркер, счётчики
+    # делятся пополам каждые cache_hot_window обращений). Ключ с
+    # cache_hot_threshold обращениями за окно живёт в cache_hot_ttl_factor
+    # раз дольше и обновляется заранее за cache_refresh_ahead доли TTL до
+    # истечения; ключ, к которому обратились один раз, - в cache_cold_ttl_factor
+    cache_hot_enabled: bool = True
+    cache_hot_width: int = 4096
+    cache_hot_depth: int = 4
+    cache_hot_window: int = 100000
+    cache_hot_threshold: int = 20
+    cache_hot_ttl_factor: float = 3.0
+    cache_cold_ttl_factor: float = 0.5
+    cache_refresh_ahead: float = 0.2
+    cache_hot_top: int = 100
+    # Прогрев кеша при старте и по сигналу ETL: топ фильмов по рейтингу,
+    # все жанры, первые страницы жанров; не больше warmup_concurrency
+    # запросов сразу, старт ждёт прогрева не дольше warmup_budget секунд
+    warmup_enabled: bool = True
+    warmup_top_films: int = 50
+    warmup_page_size: int = 50
+    warmup_genre_pages: bool = True
+    warmup_all_films: bool = False
+    warmup_concurrency: int = 8
+    warmup_budget: float = 5.0
     model_config = SettingsConfigDict(env_file='../../.env', env_file_encoding='utf-8')
 
 
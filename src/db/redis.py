@@ -1,8 +1,33 @@
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis, UnixDomainSocketConnection
 
 from core.config import settings
 
-redis: Redis | None = Redis(host=settings.redis_host, port=settings.redis_port)
+
+def create_pool() -> BlockingConnectionPool:
+    """Пул соединений Redis по настройкам.
+
+    Пул блокирующий: когда все max_connections соединений заняты, запрос
+    ждёт свободное до redis_pool_timeout секунд, а не открывает новое
+    соединение сверх лимита и не падает сразу. Ответы разбираются через
+    hiredis, если пакет установлен: redis-py выбирает его сам.
+    """
+    kwargs = {
+        'max_connections': settings.redis_max_connections,
+        'timeout': settings.redis_pool_timeout,
+        'socket_connect_timeout': settings.redis_socket_connect_timeout,
+        'health_check_interval': settings.redis_health_check_interval,
+    }
+    if settings.redis_unix_socket:
+        return BlockingConnectionPool(connection_class=UnixDomainSocketConnection,
+                                      path=settings.redis_unix_socket,
+                                      **kwargs)
+    return BlockingConnectionPool(host=settings.redis_host,
+                                  port=settings.redis_port,
+                                  socket_keepalive=settings.redis_socket_keepalive,
+                                  **kwargs)
+
+
+redis: Redis | None = Redis(connection_pool=create_pool())
 
 
 # Функция понадобится при внедрении зависимостей
@@ -1,12 +1,20 @@
+import asyncio
 import logging.config
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from api.v1 import films, persons, genres, health
 from core.config import settings
 from core.logger import LOGGING
 from db import elastic, redis
+from services.cache import get_cache
+from services.film import get_film_service
+from services.genre import get_genre_service
+from services.invalidation import get_invalidator
+from services.single_flight import get_single_flight
+from services.warmup import get_warmer
 from fastapi_pagination import add_pagination
 
 
@@ -15,16 +23,41 @@ async def lifespan(app: FastAPI):
     await elastic.es.info()
     await redis.redis.initialize()
     logging.config.dictConfig(LOGGING)
+    cache = get_cache(redis=redis.redis)
+    single_flight = get_single_flight(redis=redis.redis)
+    tasks = [asyncio.create_task(cache.tags.run_compaction(settings.cache_tag_compaction_interval,
+                                                           settings.scan_batch_size))]
+    warmer = get_warmer(
+        film_service=get_film_service(cache=cache, elastic=elastic.es, single_flight=single_flight),
+        genre_service=get_genre_service(cache=cache, elastic=elastic.es, single_flight=single_flight),
+    )
+    if settings.cache_invalidation_enabled:
+        invalidator = get_invalidator(redis=redis.redis, cache=cache, warmer=warmer)
+        tasks.append(asyncio.create_task(invalidator.run()))
+        # Сбросы, пропущенные пока API был остановлен, - до прогрева, а не поверх него
+        try:
+            await asyncio.wait_for(invalidator.replayed.wait(), timeout=settings.warmup_budget)
+        except asyncio.TimeoutError:
+            pass
+    if settings.warmup_enabled:
+        # Не дольше бюджета: недогретое догреется в фоне уже после старта
+        warmup = warmer.start()
+        tasks.append(warmup)
+        await asyncio.wait({warmup}, timeout=settings.warmup_budget)
     yield
-    redis.redis.close()
-    elastic.es.close()
+    for task in tasks:
+        task.cancel()
+    await redis.redis.aclose()
+    await redis.redis.connection_pool.disconnect()
+    await elastic.es.close()
 
 
 app = FastAPI(
     title=settings.project_name,
     docs_url='/api/openapi',
     openapi_url='/api/openapi.json',
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 add_pagination(app)
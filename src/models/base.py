@@ -1,6 +1,15 @@
+from typing import Generic, TypeVar
+
 from pydantic import BaseModel, Field
 from uuid import UUID, uuid4
 
+T = TypeVar('T')
+
 
 class UUIDMixin(BaseModel):
     uuid: UUID = Field(primary_key=True, default_factory=uuid4, alias='id')
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
@@ -41,3 +41,13 @@ class Film(UUIDMixin):
     actors: Optional[List[Actor]]
     writers: Optional[List[Writer]]
     directors: Optional[List[Director]]
+
+
+class FilmProjection(UUIDMixin):
+    title: Optional[str] = None
+    imdb_rating: Optional[float] = None
+    description: Optional[str] = None
+    genres: Optional[List[str]] = None
+    actors: Optional[List[Actor]] = None
+    writers: Optional[List[Writer]] = None
+    directors: Optional[List[Director]] = None
@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from elasticsearch import AsyncElasticsearch, NotFoundError
+
+from core.config import settings
+from .cache import note_response_data, refreshing_response
+from .codec import CacheCodec, get_codec
+from .cursor import InvalidCursorError, decode_cursor, encode_cursor
+from .helper import AsyncCache
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SEARCH_AFTER_FILTER_PATH = 'pit_id,hits.hits._source,hits.hits.sort'
+# Сортировка по релевантности с id для однозначного продолжения выдачи
+RELEVANCE_SORT = [{'_score': {'order': 'desc'}}, {'id': {'order': 'asc'}}]
+
+
+class BaseService:
+    def __init__(self,
+                 elastic: AsyncElasticsearch,
+                 cache: AsyncCache,
+                 single_flight: SingleFlight,
+                 codec: CacheCodec | None = None):
+        self.cache = cache
+        self.elastic = elastic
+        self.single_flight = single_flight
+        self.codec = codec or get_codec()
+
+    async def _cached(self,
+                      key: str,
+                      load: Callable[[], Awaitable[Any]],
+                      expire: int,
+                      tags: Callable[[Any], list[str]] | None = None,
+                      max_expire: int | None = None) -> Any:
+        """Достать значение из кеша, а при промахе загрузить его один раз на ключ.
+
+        В кеш кладутся сырые `_source` документов Elasticsearch. Запись живёт
+        в кеше ещё CACHE_STALE_TTL секунд после истечения expire: в это время
+        устаревшее значение отдаётся сразу, а свежее загружается в фоне
+        (stale-while-revalidate). tags по загруженному значению возвращает
+        теги, по которым запись потом можно сбросить. Кеш может продлить
+        expire для часто читаемых ключей и сократить для редких; горячие
+        ключи обновляются в фоне ещё до истечения, а при заблаговременной
+        пересборке ответа ручки - сразу. max_expire ограничивает срок и
+        для горячих ключей: для записей, которые теги не сбросят, когда
+        в выдачу попадёт новый документ.
+        """
+
+        def lifetime() -> int:
+            ttl = self.cache.expire_for(key, expire)
+            return min(ttl, max_expire) if max_expire else ttl
+
+        async def from_cache() -> tuple[Any, float]:
+            data = await self.cache.get(key)
+            if not data:
+                return None, 0
+            entry = self.codec.decode(data)
+            if entry is None:
+                return None, 0
+            fresh_until, value = entry
+            return value, fresh_until
+
+        def refresh_due(fresh_until: float) -> bool:
+            remaining = fresh_until - time.time()
+            return remaining > 0 and self.cache.refresh_due(key, remaining, lifetime())
+
+        async def fresh_from_cache():
+            value, fresh_until = await from_cache()
+            return value if fresh_until > time.time() else None
+
+        async def refreshed_in_cache():
+            # Другой воркер мог уже обновить запись заранее
+            value, fresh_until = await from_cache()
+            return value if fresh_until > time.time() and not refresh_due(fresh_until) else None
+
+        async def fill(cached: bool = False):
+            value = await load()
+            if value:
+                ttl = lifetime()
+                data = self.codec.encode(value, time.time() + ttl)
+                await self.cache.set(key, data, ttl + settings.cache_stale_ttl,
+                                     tags=tags(value) if tags else None)
+            elif cached:
+                # Документа больше нет: не отдавать устаревшую запись до конца окна
+                await self.cache.delete_many([key])
+            return value
+
+        def note(value: Any, fresh_until: float):
+            note_response_data(fresh_until, [key], tags(value) if tags and value else None)
+
+        value, fresh_until = await from_cache()
+        if value and fresh_until > time.time():
+            if refresh_due(fresh_until):
+                if refreshing_response():
+                    # Ответ пересобирается заранее: он должен прожить полный срок, а не остаток записи
+                    value = await self.single_flight.do(key, lambda: fill(cached=True), recheck=refreshed_in_cache)
+                    note(value, time.time() + lifetime())
+                    return value
+                self._revalidate(key, lambda: fill(cached=True), refreshed_in_cache)
+            note(value, fresh_until)
+            return value
+        if value:
+            self._revalidate(key, lambda: fill(cached=True), fresh_from_cache)
+            # Ответ из устаревшей записи не кешируется
+            note(value, fresh_until)
+            return value
+        value = await self.single_flight.do(key, fill, recheck=fresh_from_cache)
+        note(value, time.time() + lifetime())
+        return value
+
+    async def _cached_many(self,
+                           ids: list[str],
+                           key: Callable[[str], str],
+                           load_many: Callable[[list[str]], Awaitable[dict[str, Any]]],
+                           expire: int) -> dict[str, Any]:
+        """Пакетный вариант _cached: один MGET в кеш и одна загрузка промахов.
+
+        Возвращает найденные значения по идентификаторам, устаревшие записи
+        отдаются сразу и обновляются в фоне. Срок каждой записи, как и в
+        _cached, кеш подбирает по частоте обращений к её ключу, а горячие
+        записи обновляются заранее.
+        """
+        ids = list(dict.fromkeys(ids))
+        keys = {id_: key(id_) for id_ in ids}
+        found: dict[str, Any] = {}
+        missing: list[str] = []
+        stale: list[str] = []
+        due: list[str] = []
+        refreshing = refreshing_response()
+        # Ответ сбрасывается и при появлении документа, которого не было
+        note_response_data(math.inf, keys.values())
+        values = await self.cache.get_many(list(keys.values()))
+        ttls = {id_: self.cache.expire_for(keys[id_], expire) for id_ in ids}
+        now = time.time()
+        for id_, data in zip(ids, values):
+            entry = self.codec.decode(data) if data else None
+            if entry is None:
+                missing.append(id_)
+                continue
+            fresh_until, found[id_] = entry
+            if fresh_until <= now:
+                stale.append(id_)
+            elif self.cache.refresh_due(keys[id_], fresh_until - now, ttls[id_]):
+                due.append(id_)
+                if refreshing:
+                    # Пересобираемый заранее ответ получит срок обновлённых записей
+                    continue
+            note_response_data(fresh_until)
+
+        async def fill(batch: list[str], cached: bool = False) -> dict[str, Any]:
+            loaded = await load_many(batch)
+            now = time.time()
+            by_ttl: dict[int, dict[str, bytes]] = {}
+            for id_, value in loaded.items():
+                if value:
+                    by_ttl.setdefault(ttls[id_], {})[keys[id_]] = self.codec.encode(value, now + ttls[id_])
+            for ttl, items in by_ttl.items():
+                await self.cache.set_many(items, ttl + settings.cache_stale_ttl)
+            if cached:
+                # Удалённые документы не должны отдаваться из устаревших записей
+                await self.cache.delete_many([keys[id_] for id_ in batch if not loaded.get(id_)])
+            return loaded
+
+        if stale:
+            batch_key = 'batch:' + ','.join(keys[id_] for id_ in stale)
+            self._revalidate(batch_key, lambda: fill(stale, cached=True), None)
+        if due and refreshing:
+            loaded = await fill(due, cached=True)
+            found.update({id_: loaded.get(id_) for id_ in due})
+            note_response_data(time.time() + min(ttls[id_] for id_ in due))
+        elif due:
+            batch_key = 'batch:' + ','.join(keys[id_] for id_ in due)
+            self._revalidate(batch_key, lambda: fill(due, cached=True), None)
+        if missing:
+            found.update(await fill(missing))
+            note_response_data(time.time() + min(ttls[id_] for id_ in missing))
+        return {id_: found[id_] for id_ in ids if found.get(id_)}
+
+    async def _mget_from_elastic(self, index: str, ids: list[str]) -> dict[str, dict]:
+        if not ids:
+            return {}
+        try:
+            docs = await self.elastic.mget(index=index, ids=ids)
+        except NotFoundError:
+            return {}
+        return {doc['_id']: doc['_source'] for doc in docs['docs'] if doc.get('found')}
+
+    async def _search_after(self,
+                            index: str,
+                            body: dict,
+                            size: int,
+                            cursor: str | None = None,
+                            consistent: bool = False) -> tuple[list[dict], str | None]:
+        """Страница выдачи по курсору search_after вместо from_.
+
+        Стоимость страницы не зависит от её номера. При consistent=True
+        обход идёт по point in time, чтобы индексация не сдвигала выдачу
+        между страницами; id PIT передаётся клиенту внутри курсора.
+        """
+        search_after, pit_id = decode_cursor(cursor)
+        if consistent and pit_id is None:
+            pit = await self.elastic.open_point_in_time(index=index, keep_alive=settings.pit_keep_alive)
+            pit_id = pit['id']
+
+        body = dict(body, size=size)
+        if search_after:
+            body['search_after'] = search_after
+        try:
+            if pit_id:
+                body['pit'] = {'id': pit_id, 'keep_alive': settings.pit_keep_alive}
+                docs = await self.elastic.search(body=body, filter_path=SEARCH_AFTER_FILTER_PATH)
+            else:
+                docs = await self.elastic.search(index=index, body=body, filter_path=SEARCH_AFTER_FILTER_PATH)
+        except NotFoundError:
+            if pit_id:
+                raise InvalidCursorError('cursor expired')
+            return [], None
+
+        hits = docs.get('hits', {}).get('hits', [])
+        pit_id = docs.get('pit_id', pit_id)
+        if len(hits) < size:
+            if pit_id:
+                await self.elastic.close_point_in_time(body={'id': pit_id})
+            return [hit['_source'] for hit in hits], None
+        return [hit['_source'] for hit in hits], encode_cursor(hits[-1]['sort'], pit_id)
+
+    async def _scan(self, index: str, query: dict | None = None) -> AsyncIterator[dict]:
+        """Обойти весь индекс пачками через point in time и search_after.
+
+        Память не зависит от размера индекса: документы отдаются по мере
+        чтения, а не собираются в один список.
+        """
+        try:
+            pit = await self.elastic.open_point_in_time(index=index, keep_alive=settings.pit_keep_alive)
+        except NotFoundError:
+            return
+        pit_id = pit['id']
+        body = {
+            'query': query or {'match_all': {}},
+            'sort': [{'_shard_doc': 'asc'}],
+            'size': settings.scan_batch_size,
+        }
+        try:
+            while True:
+                body['pit'] = {'id': pit_id, 'keep_alive': settings.pit_keep_alive}
+                docs = await self.elastic.search(body=body, filter_path=SEARCH_AFTER_FILTER_PATH)
+                pit_id = docs.get('pit_id', pit_id)
+                hits = docs.get('hits', {}).get('hits', [])
+                for hit in hits:
+                    yield hit['_source']
+                if len(hits) < settings.scan_batch_size:
+                    break
+                body['search_after'] = hits[-1]['sort']
+        finally:
+            await self.elastic.close_point_in_time(body={'id': pit_id})
+
+    async def _cached_search_after(self,
+                                   key: str,
+                                   index: str,
+                                   body: dict,
+                                   size: int,
+                                   cursor: str | None,
+                                   consistent: bool,
+                                   expire: int,
+                                   tags: Callable[[list[dict]], list[str]] | None = None,
+                                   max_expire: int | None = None) -> tuple[list[dict], str | None]:
+        """Закешированная страница search_after; страницы внутри PIT не кешируются."""
+        if consistent or decode_cursor(cursor)[1]:
+            return await self._search_after(index, body, size, cursor, consistent)
+
+        async def load():
+            docs, next_cursor = await self._search_after(index, body, size, cursor)
+            if not docs:
+                return None
+            return {'docs': docs, 'next_cursor': next_cursor}
+
+        page = await self._cached(key, load, expire, (lambda page: tags(page['docs'])) if tags else None, max_expire)
+        if not page:
+            return [], None
+        return page['docs'], page['next_cursor']
+
+    def _revalidate(self, key: str, fill, recheck):
+        if self.single_flight.in_flight(key):
+            return
+        task = self.single_flight.start(key, fill, recheck)
+        task.add_done_callback(lambda t: _log_refresh_error(key, t))
+
+
+def _log_refresh_error(key: str, task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('background refresh of %s failed', key, exc_info=task.exception())
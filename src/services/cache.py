@@ -0,0 +1,324 @@
+import asyncio
+import fnmatch
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterable, Iterator
+
+from fastapi import Depends
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.redis import get_redis
+from .codec import CACHE_SCHEMA_VERSION
+from .helper import AsyncCache
+from .hotkeys import HotKeys
+from .tags import TagIndex, data_key_tag
+
+
+def response_cache_key(path: str, query: str = '') -> str:
+    """Ключ кеша готового ответа ручки по пути и отсортированной строке запроса."""
+    return f'response:v{CACHE_SCHEMA_VERSION}:{path}?{query}'
+
+
+def response_cache_pattern(path_prefix: str) -> str:
+    """Шаблон ключей всех ответов ручек, чей путь начинается с path_prefix."""
+    return f'response:v{CACHE_SCHEMA_VERSION}:{path_prefix}*'
+
+
+@dataclass
+class ResponseScope:
+    """Данные, из которых строится ответ ручки.
+
+    Сервисы отмечают, до какого момента свежи прочитанные ими записи кеша;
+    готовый ответ кешируется не дольше самой несвежей из них, поэтому не
+    переживает данные, из которых собран. Ответ регистрируется в тегах
+    этих записей и в тегах их содержимого, поэтому сбрасывается вместе
+    с ними.
+    """
+    key: str
+    fresh_until: float = math.inf
+    tags: set[str] = field(default_factory=set)
+    # Ответ пересобирается до истечения: данные, которые пора обновить, обновляются сразу
+    refresh: bool = False
+
+
+_response_scope: ContextVar[ResponseScope | None] = ContextVar('response_scope', default=None)
+
+
+@contextmanager
+def response_scope(key: str, refresh: bool = False) -> Iterator[ResponseScope]:
+    scope = ResponseScope(key, refresh=refresh)
+    token = _response_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _response_scope.reset(token)
+
+
+def note_response_data(fresh_until: float, keys: Iterable[str] = (), tags: Iterable[str] | None = None):
+    """Отметить в ответе текущего запроса записи keys, свежие до fresh_until, и их теги."""
+    scope = _response_scope.get()
+    if scope is not None:
+        scope.fresh_until = min(scope.fresh_until, fresh_until)
+        scope.tags.update(data_key_tag(key) for key in keys)
+        scope.tags.update(tags or ())
+
+
+def refreshing_response() -> bool:
+    """Собирается ли в текущем запросе ответ на замену истекающему в кеше."""
+    scope = _response_scope.get()
+    return scope is not None and scope.refresh
+
+
+def _response_keys(key: str) -> tuple[str, ...]:
+    # Ключ ответа, который собирается из записи key в текущем запросе
+    scope = _response_scope.get()
+    return (scope.key,) if scope is not None and scope.key != key else ()
+
+
+class LocalCache:
+    """LRU-кеш в памяти воркера, ограниченный по числу ключей и времени жизни."""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expire_at, value = item
+        if expire_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, expire: float | None = None):
+        # Локальная копия не должна жить дольше, чем запись в Redis
+        ttl = min(expire, self.ttl) if expire else self.ttl
+        if ttl <= 0 or self.max_size <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def delete_matching(self, patterns: list[str]):
+        for key in [key for key in self._data if any(fnmatch.fnmatchcase(key, p) for p in patterns)]:
+            del self._data[key]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+class ReadBatch:
+    """Чтения из Redis, собранные за один проход цикла событий.
+
+    Ключи, запрошенные одновременно (например, из asyncio.gather), уходят
+    в Redis одним пайплайном GET+PTTL вместо отдельного запроса на каждый.
+    Пайплайн отправляется на следующем проходе цикла событий, так что
+    одиночное чтение не ждёт дольше обычного.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.batches = 0
+        self.keys = 0
+        self._pending: dict[str, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, key: str) -> asyncio.Future:
+        """Будущий результат (значение, pttl) для ключа."""
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._flush)
+            future = self._pending[key] = loop.create_future()
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, {}
+        task = asyncio.create_task(self._execute(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, pending: dict[str, asyncio.Future]):
+        self.batches += 1
+        self.keys += len(pending)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in pending:
+                    pipe.get(key)
+                    pipe.pttl(key)
+                results = await pipe.execute()
+        except Exception as exc:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for i, future in enumerate(pending.values()):
+            if not future.done():
+                future.set_result((results[2 * i], results[2 * i + 1]))
+
+
+_read_batch: ContextVar[ReadBatch | None] = ContextVar('cache_read_batch', default=None)
+
+
+class LayeredCache(AsyncCache):
+    """Двухуровневый кеш: LRU в памяти воркера поверх Redis.
+
+    Записи можно пометить тегами и затем удалить все записи с тегом.
+    С hot обращения к ключам учитываются, и время жизни записей зависит
+    от частоты обращений.
+    """
+
+    def __init__(self, redis: Redis, local: LocalCache, tags: TagIndex, hot: HotKeys | None = None):
+        self.redis = redis
+        self.local = local
+        self.tags = tags
+        self.hot = hot
+
+    async def get(self, key: str, **kwargs):
+        if self.hot is not None:
+            self.hot.record(key)
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        # Остаток TTL забираем тем же запросом, чтобы локальная копия
+        # истекла не позже, чем запись в Redis
+        batch = _read_batch.get()
+        if batch is not None and batch.redis is self.redis:
+            value, pttl = await batch.get(key)
+        else:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = await pipe.execute()
+        if value is None:
+            return None
+        self.local.set(key, value, pttl / 1000 if pttl > 0 else None)
+        return value
+
+    async def set(self, key: str, value: str, expire: int, tags: list[str] | None = None, **kwargs):
+        if tags:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=expire)
+                self.tags.register(pipe, key, tags, expire)
+                await pipe.execute()
+        else:
+            await self.redis.set(key, value, ex=expire)
+        self.local.set(key, value, expire)
+
+    async def get_many(self, keys: list[str], **kwargs) -> list:
+        if self.hot is not None:
+            for key in keys:
+                self.hot.record(key)
+        values = [self.local.get(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.mget(missing)
+            for key in missing:
+                pipe.pttl(key)
+            found, *pttls = await pipe.execute()
+        loaded = {}
+        for key, value, pttl in zip(missing, found, pttls):
+            if value is not None:
+                self.local.set(key, value, pttl / 1000 if pttl > 0 else None)
+                loaded[key] = value
+        return [value if value is not None else loaded.get(key) for key, value in zip(keys, values)]
+
+    async def set_many(self, items: dict[str, str], expire: int, **kwargs):
+        if not items:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(key, value, ex=expire)
+            await pipe.execute()
+        for key, value in items.items():
+            self.local.set(key, value, expire)
+
+    async def delete_many(self, keys: list[str], **kwargs):
+        if not keys:
+            return
+        for key in keys:
+            self.local.delete(key)
+        await self.redis.delete(*keys)
+
+    async def delete_matching(self, patterns: list[str], **kwargs) -> int:
+        deleted = 0
+        for pattern in patterns:
+            keys = [key async for key in self.redis.scan_iter(match=pattern, count=settings.scan_batch_size)]
+            for start in range(0, len(keys), settings.scan_batch_size):
+                deleted += await self.redis.delete(*keys[start:start + settings.scan_batch_size])
+        self.local.delete_matching(patterns)
+        return deleted
+
+    @asynccontextmanager
+    async def pipelined(self) -> AsyncIterator[None]:
+        batch = ReadBatch(self.redis)
+        token = _read_batch.set(batch)
+        try:
+            yield
+        finally:
+            _read_batch.reset(token)
+
+    async def invalidate_tags(self, tags: list[str], **kwargs) -> int:
+        keys = await self.tags.invalidate(tags)
+        for key in keys:
+            self.local.delete(key)
+        return len(keys)
+
+    # Чтения, закрытые кешем ответа, считаются чтениями записей, из которых он собран
+    def expire_for(self, key: str, expire: int) -> int:
+        return self.hot.expire_for(key, expire, *_response_keys(key)) if self.hot is not None else expire
+
+    def refresh_due(self, key: str, remaining: float, expire: int) -> bool:
+        return self.hot is not None and self.hot.refresh_due(key, remaining, expire, *_response_keys(key))
+
+    def hot_keys(self) -> list[tuple[str, int]]:
+        return self.hot.hot_keys() if self.hot is not None else []
+
+    def stats(self) -> dict:
+        return self.local.stats()
+
+
+@lru_cache()
+def get_cache(redis: Redis = Depends(get_redis)) -> AsyncCache:
+    hot = None
+    if settings.cache_hot_enabled:
+        hot = HotKeys(settings.cache_hot_width,
+                      settings.cache_hot_depth,
+                      settings.cache_hot_window,
+                      settings.cache_hot_threshold,
+                      settings.cache_hot_ttl_factor,
+                      settings.cache_cold_ttl_factor,
+                      settings.cache_refresh_ahead,
+                      settings.cache_hot_top)
+    return LayeredCache(redis, LocalCache(settings.local_cache_max_size, settings.local_cache_ttl), TagIndex(redis),
+                        hot)
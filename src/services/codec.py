@@ -0,0 +1,127 @@
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any
+
+import orjson
+
+from core.config import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Версия формата записей в кеше. Увеличивается при любом несовместимом
+# изменении кодека или структуры кешируемых документов: записи со старой
+# версией после деплоя считаются промахом, а не ломают десериализацию.
+CACHE_SCHEMA_VERSION = 1
+
+# b'v' + версия, признак сжатия, момент до которого запись свежая (мс)
+_HEADER = struct.Struct('>cBcQ')
+
+_COMPRESSORS = {
+    b'z': (lambda data: zlib.compress(data, 1), zlib.decompress),
+}
+if zstandard is not None:
+    _COMPRESSORS[b's'] = (zstandard.ZstdCompressor(level=3).compress,
+                          zstandard.ZstdDecompressor().decompress)
+if lz4_frame is not None:
+    _COMPRESSORS[b'l'] = (lz4_frame.compress, lz4_frame.decompress)
+
+COMPRESSION_FLAGS = {'zlib': b'z', 'zstd': b's', 'lz4': b'l'}
+
+
+class CacheCodec(ABC):
+    """Кодек записей кеша: сериализация, сжатие и заголовок с версией схемы."""
+
+    def __init__(self, compression: str | None = None, compress_threshold: int = 1024):
+        self.compress_threshold = compress_threshold
+        self.compression_flag = COMPRESSION_FLAGS.get(compression) if compression else None
+        if compression and self.compression_flag not in _COMPRESSORS:
+            raise ValueError(f'compression {compression} is not available')
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        pass
+
+    def encode(self, value: Any, fresh_until: float = 0) -> bytes:
+        body = self.dumps(value)
+        flag = b'n'
+        if self.compression_flag is not None and len(body) >= self.compress_threshold:
+            flag = self.compression_flag
+            body = _COMPRESSORS[flag][0](body)
+        return _HEADER.pack(b'v', CACHE_SCHEMA_VERSION, flag, int(fresh_until * 1000)) + body
+
+    def decode(self, data: bytes | str) -> tuple[float, Any] | None:
+        """Вернуть (момент окончания свежести, значение) или None для чужого формата."""
+        if isinstance(data, str):
+            data = data.encode()
+        if len(data) < _HEADER.size:
+            return None
+        magic, version, flag, fresh_until = _HEADER.unpack_from(data)
+        if magic != b'v' or version != CACHE_SCHEMA_VERSION:
+            return None
+        body = memoryview(data)[_HEADER.size:]
+        if flag != b'n':
+            if flag not in _COMPRESSORS:
+                return None
+            body = _COMPRESSORS[flag][1](body)
+        return fresh_until / 1000, self.loads(body)
+
+
+class OrjsonCodec(CacheCodec):
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(CacheCodec):
+    def __init__(self, *args, **kwargs):
+        if msgpack is None:
+            raise ValueError('msgpack is not installed')
+        super().__init__(*args, **kwargs)
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data)
+
+
+class BytesCodec(CacheCodec):
+    """Готовые байты, например тело ответа ручки: только заголовок записи."""
+
+    def dumps(self, value: bytes) -> bytes:
+        return value
+
+    def loads(self, data: bytes) -> bytes:
+        return bytes(data)
+
+
+CODECS: dict[str, type[CacheCodec]] = {
+    'orjson': OrjsonCodec,
+    'msgpack': MsgpackCodec,
+}
+
+
+@lru_cache()
+def get_codec() -> CacheCodec:
+    return CODECS[settings.cache_codec](settings.cache_compression, settings.cache_compress_threshold)
@@ -0,0 +1,30 @@
+import base64
+import binascii
+
+import orjson
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(search_after: list, pit_id: str | None = None) -> str:
+    """Непрозрачный курсор: значения сортировки последнего документа и point in time."""
+    payload = {'after': search_after}
+    if pit_id:
+        payload['pit'] = pit_id
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None) -> tuple[list | None, str | None]:
+    """Вернуть (search_after, pit_id); пустой курсор означает первую страницу."""
+    if not cursor:
+        return None, None
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        search_after, pit_id = payload['after'], payload.get('pit')
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise InvalidCursorError('invalid cursor')
+    if not isinstance(search_after, list):
+        raise InvalidCursorError('invalid cursor')
+    return search_after, pit_id
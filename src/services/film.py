@@ -1,6 +1,5 @@
 from functools import lru_cache
-from typing import Optional, List
-import pickle
+from typing import AsyncIterator, Optional, List
 import logging
 from pydantic import BaseModel
 
@@ -8,201 +7,289 @@ from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends, Query
 from redis.asyncio import Redis
 
+from core.config import settings
 from db.elastic import get_elastic
-from db.redis import get_redis
-from models.movies import Film
+from models.movies import Film, FilmProjection
+from .base import RELEVANCE_SORT, BaseService
+from .cache import get_cache
 from .helper import AsyncCache
+from .single_flight import SingleFlight, get_single_flight
 
 FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 минут
 
+# Поля, по которым разрешена сортировка, и соответствующие им поля индекса
+FILM_SORT_FIELDS = {
+    'imdb_rating': 'imdb_rating',
+    'title': 'title.raw',
+}
+FILM_SORT_PATTERN = '^-?(' + '|'.join(FILM_SORT_FIELDS) + ')$'
 
-class FilmService:
-    def __init__(self, elastic: AsyncElasticsearch, cache: AsyncCache):
-        self.cache = cache
-        self.elastic = elastic
+# Поля фильма, которые можно запросить через fields= (проекция _source)
+FILM_FIELDS = ('id', 'title', 'imdb_rating', 'description', 'genres', 'actors', 'writers', 'directors')
+FILM_FIELDS_PATTERN = '^({0})(,({0}))*$'.format('|'.join(FILM_FIELDS))
 
+
+def parse_fields(fields: str | None) -> tuple[str, ...] | None:
+    """`title,imdb_rating` -> ('id', 'imdb_rating', 'title'); id нужен всегда."""
+    if not fields:
+        return None
+    return tuple(sorted(set(fields.split(',')) | {'id'}))
+
+
+class FilmService(BaseService):
     async def get_by_id(self, film_id: str) -> Optional[Film]:
         key = self.cache_key('film_get_by_id', film_id)
-        film = await self._film_from_cache(film_id) # TODO: update key
-        if not film:
-            film = await self._get_film_from_elastic(film_id)
-            if not film:
-                return None
-            await self._put_film_to_cache(key, film)
-        return film
-
-    async def get(self, genre: str, title: str, page: int, size: int) -> Optional[List[Film]]:
-        key = self.cache_key('film_get', genre, title, page, size)
-        films = await self._films_from_cache(key)
-        if not films:
-            films = await self._get_films_from_elastic(genre, title, page, size)
-            if not films:
-                return None
-            await self._put_films_to_cache(key, films)
-        return films
-
-    async def get_by_search(self, phrase: str, page: int, size: int) -> Optional[List[Film]]:
-        key = self.cache_key('film_get_by_search', phrase, page, size)
-        films = await self._films_from_cache(key)
-        if not films:
-            films = await self._search_films_from_elastic(phrase, page, size)
-            if not films:
-                return None
-            await self._put_films_to_cache(key, films)
-        return films
-
-    async def get_all_from_elastic(self) -> list[Film] | None:
-        try:
-            docs = await self.elastic.search(index='movies',
-                                             size='10000',
-                                             filter_path='hits.hits._source',
-                                             query={'match_all': {}}
-                                             )
-            if not docs:
-                return None
-            res: List[Film] = []
-            for doc in docs['hits']['hits']:
-                film = await self._film_doc_to_model(doc)
-                res.append(film)
-            return res
-        except NotFoundError:
+        doc = await self._cached(key,
+                                 lambda: self._get_film_from_elastic(film_id),
+                                 FILM_CACHE_EXPIRE_IN_SECONDS)
+        if not doc:
             return None
+        return await self._film_doc_to_model(doc)
 
-    async def get_all(self) -> list[Film] | None:
-        key = 'all_films'
-        films = await self._films_from_cache(key)
-        if not films:
-            films = await self.get_all_from_elastic()
-            if not films:
-                return None
-            await self._put_films_to_cache(key, films)
+    async def get_many(self, film_ids: list[str]) -> list[Film]:
+        docs = await self._cached_many(film_ids,
+                                       lambda film_id: self.cache_key('film_get_by_id', film_id),
+                                       lambda ids: self._mget_from_elastic('movies', ids),
+                                       FILM_CACHE_EXPIRE_IN_SECONDS)
+        return await self._films_to_models(list(docs.values())) or []
+
+    async def get(self,
+                  genre: str,
+                  title: str,
+                  page: int,
+                  size: int,
+                  sort: str = None,
+                  fields: tuple[str, ...] = None) -> Optional[List[Film | FilmProjection]]:
+        key = self.cache_key('film_get', genre, title, page, size, sort, self._fields_key(fields))
+        docs = await self._cached(key,
+                                  lambda: self._get_films_from_elastic(genre, title, page, size, sort, fields),
+                                  FILM_CACHE_EXPIRE_IN_SECONDS,
+                                  lambda docs: self.film_tags(docs, genre),
+                                  self.list_max_expire(genre))
+        return await self._films_to_models(docs, fields)
+
+    async def get_after(self,
+                        genre: str,
+                        title: str,
+                        size: int,
+                        sort: str = None,
+                        cursor: str = None,
+                        consistent: bool = False,
+                        fields: tuple[str, ...] = None) -> tuple[List[Film | FilmProjection], Optional[str]]:
+        key = self.cache_key('film_get_after', genre, title, size, sort, self._fields_key(fields), cursor)
+        body = self._films_query(genre, title)
+        body['sort'] = self._sort_clause(sort) if sort else RELEVANCE_SORT
+        if fields:
+            body['_source'] = list(fields)
+        docs, next_cursor = await self._cached_search_after(key, 'movies', body, size, cursor, consistent,
+                                                            FILM_CACHE_EXPIRE_IN_SECONDS,
+                                                            lambda docs: self.film_tags(docs, genre),
+                                                            self.list_max_expire(genre))
+        return await self._films_to_models(docs, fields) or [], next_cursor
+
+    async def get_by_search_after(self,
+                                  phrase: str,
+                                  size: int,
+                                  cursor: str = None,
+                                  consistent: bool = False,
+                                  fields: tuple[str, ...] = None) -> tuple[List[Film | FilmProjection], Optional[str]]:
+        key = self.cache_key('film_get_by_search_after', phrase, size, self._fields_key(fields), cursor)
+        body = dict(self._search_query(phrase), sort=RELEVANCE_SORT)
+        if fields:
+            body['_source'] = list(fields)
+        docs, next_cursor = await self._cached_search_after(key, 'movies', body, size, cursor, consistent,
+                                                            FILM_CACHE_EXPIRE_IN_SECONDS, self.film_tags,
+                                                            settings.cache_list_max_expire)
+        return await self._films_to_models(docs, fields) or [], next_cursor
+
+    async def get_by_search(self,
+                            phrase: str,
+                            page: int,
+                            size: int,
+                            fields: tuple[str, ...] = None) -> Optional[List[Film | FilmProjection]]:
+        key = self.cache_key('film_get_by_search', phrase, page, size, self._fields_key(fields))
+        docs = await self._cached(key,
+                                  lambda: self._search_films_from_elastic(phrase, page, size, fields),
+                                  FILM_CACHE_EXPIRE_IN_SECONDS,
+                                  self.film_tags,
+                                  settings.cache_list_max_expire)
+        return await self._films_to_models(docs, fields)
+
+    async def export(self) -> AsyncIterator[Film]:
+        """Все фильмы каталога по одному, без загрузки индекса в память."""
+        async for doc in self._scan('movies'):
+            yield await self._film_doc_to_model(doc)
 
-        return films
+    async def get_all_from_elastic(self) -> list[dict] | None:
+        return [doc async for doc in self._scan('movies')] or None
 
-    async def _search_films_from_elastic(self, phrase: str, page: int, size: int) -> Optional[List[Film]]:
+    async def get_all(self) -> list[Film] | None:
+        docs = await self._cached('all_films', self.get_all_from_elastic, FILM_CACHE_EXPIRE_IN_SECONDS)
+        return await self._films_to_models(docs)
+
+    async def _search_films_from_elastic(self,
+                                         phrase: str,
+                                         page: int,
+                                         size: int,
+                                         fields: tuple[str, ...] = None) -> Optional[List[dict]]:
         try:
             docs = await self.elastic.search(
                 index='movies',
                 filter_path='hits.hits._source',
                 size=size,
                 from_=(page-1)*size,
-                body={
-                    "query": {
-                        "bool": {
-                            "must": [{ "match": { "title": phrase } },]
-                            }
-                        }
-                    }
+                source_includes=fields,
+                body=self._search_query(phrase)
             )
             if not docs:
                 return None
-            res: List[Film] = []
-            for doc in docs['hits']['hits']:
-                film = await self._film_doc_to_model(doc)
-                res.append(film)
-            return res
+            return [doc['_source'] for doc in docs['hits']['hits']]
         except NotFoundError:
             return None
 
-    async def _get_film_from_elastic(self, film_id: str) -> Optional[Film]:
+    async def _get_film_from_elastic(self, film_id: str) -> Optional[dict]:
         try:
             doc = await self.elastic.get(index='movies', id=film_id)
         except NotFoundError:
             return None
-        return await self._film_doc_to_model(doc)
+        return doc['_source']
+
+    async def _films_to_models(self,
+                               docs: list[dict] | None,
+                               fields: tuple[str, ...] = None) -> Optional[List[Film | FilmProjection]]:
+        if not docs:
+            return None
+        return [await self._film_doc_to_model(doc, fields) for doc in docs]
 
-    async def _film_doc_to_model(self, doc) -> Film:
-        _doc = doc['_source'].copy()
-
-        if 'directors' in _doc:
-            _directors = [{'uuid': d['id'], 'full_name': d['name'], 'films': []} for d in _doc['directors']]
-        else:
-            _directors = []
-        _doc['directors'] = _directors
-
-        if 'writers' in _doc:
-            _writers = [{'uuid': w['id'], 'full_name': w['name'], 'films': []} for w in _doc['writers']]
-        else:
-            _writers = []
-        _doc['writers'] = _writers
-
-        if 'actors' in _doc:
-            _actors = [{'uuid': a['id'], 'full_name': a['name'], 'films': []} for a in _doc['actors']]
-        else:
-            _actors = []
-        _doc['actors'] = _actors
-        
+    async def _film_doc_to_model(self, source: dict, fields: tuple[str, ...] = None) -> Film | FilmProjection:
+        _doc = source.copy()
+
+        for role in ('directors', 'writers', 'actors'):
+            if fields and role not in fields:
+                continue
+            _doc[role] = [{'id': p['id'], 'full_name': p['name'], 'films': []} for p in _doc.get(role, [])]
+
+        if fields:
+            return FilmProjection(**{field: _doc[field] for field in fields if field in _doc})
         return Film(**_doc)
 
+    @staticmethod
+    def _fields_key(fields: tuple[str, ...] | None) -> str | None:
+        return ','.join(fields) if fields else None
+
     async def _get_films_from_elastic(
             self, 
             genre: str = None, 
             title: str = None, 
             page: int = 1, 
-            size: int = 50
-        ):
+            size: int = 50,
+            sort: str = None,
+            fields: tuple[str, ...] = None
+        ) -> Optional[List[dict]]:
         try:
-            if genre or title:
-                cond = []
-                if genre:
-                    cond.append(
-                        { "match": { "genres": genre } }
-                    )
-                if title:
-                    cond.append(
-                        { "match": { "title": title } }
-                    )
-                query = {
-                    "query": {
-                        "bool": {
-                            "must": cond
-                            }
-                        }
-                    }
-                docs = await self.elastic.search(
-                    index='movies', 
-                    filter_path='hits.hits._source',
-                    size=size,
-                    from_=(page-1)*size,
-                    body=query
-                )
-            else:
-                docs = await self.elastic.search(
-                    index='movies',                    
-                    filter_path='hits.hits._source',
-                    size=size,
-                    from_=(page-1)*size
-                )  
+            query = self._films_query(genre, title)
+            if sort:
+                query["sort"] = self._sort_clause(sort)
+            docs = await self.elastic.search(
+                index='movies',
+                filter_path='hits.hits._source',
+                size=size,
+                from_=(page-1)*size,
+                source_includes=fields,
+                body=query or None
+            )
         except NotFoundError:
             return None
 
-        res: List[Film] = []
         if 'hits' in docs and 'hits' in docs['hits']:
-            for doc in docs['hits']['hits']:
-                film = await self._film_doc_to_model(doc)
-                res.append(film)
-        return res
+            return [doc['_source'] for doc in docs['hits']['hits']]
+        return []
 
-    async def _film_from_cache(self, key: str) -> Optional[Film]:
-        data = await self.cache.get(key)
-        if not data:
-            return None
-        film = Film.parse_raw(data)
-        return film
+    @staticmethod
+    def _films_query(genre: str = None, title: str = None) -> dict:
+        if not (genre or title):
+            return {}
+        cond = []
+        if genre:
+            cond.append(
+                { "match": { "genres": genre } }
+            )
+        if title:
+            cond.append(
+                { "match": { "title": title } }
+            )
+        return {
+            "query": {
+                "bool": {
+                    "must": cond
+                    }
+                }
+            }
 
-    async def _films_from_cache(self, key: str) -> Optional[List[Film]]:
-        data = await self.cache.get(key)
-        if not data:
-            return None
-        return pickle.loads(data)
+    @staticmethod
+    def _search_query(phrase: str) -> dict:
+        return {
+            "query": {
+                "bool": {
+                    "must": [{ "match": { "title": phrase } },]
+                    }
+                }
+            }
+
+    @staticmethod
+    def _sort_clause(sort: str) -> list[dict]:
+        """Перевести `-imdb_rating` в сортировку Elasticsearch по doc values."""
+        order = 'desc' if sort.startswith('-') else 'asc'
+        field = FILM_SORT_FIELDS[sort.lstrip('-')]
+        # id - для стабильного порядка фильмов с одинаковым значением поля
+        return [{field: {'order': order}}, {'id': {'order': 'asc'}}]
+
+    @classmethod
+    def invalidation_keys(cls, film_ids: list[str]) -> list[str]:
+        """Ключи кеша, устаревающие при изменении фильмов."""
+        return [cls.cache_key('film_get_by_id', film_id) for film_id in film_ids] + ['all_films']
+
+    @staticmethod
+    def cache_patterns() -> list[str]:
+        """Шаблоны всех ключей кеша фильмов: для сброса после переиндексации."""
+        return ['film_get*', 'all_films']
+
+    @staticmethod
+    def invalidation_tags(film_ids: list[str]) -> list[str]:
+        """Теги списков и поисков, в которые попали фильмы."""
+        return [f'film:{film_id}' for film_id in film_ids]
+
+    @staticmethod
+    def genre_tags(genres: list[str]) -> list[str]:
+        """Теги списков фильмов с фильтром по жанрам: в них может войти фильм этих жанров."""
+        return [f'genre:{genre}' for genre in genres]
+
+    @staticmethod
+    def list_max_expire(genre: str | None) -> int | None:
+        """Предел срока жизни списка фильмов.
+
+        Список с фильтром по жанру сбрасывается по тегу жанра при изменении
+        любого фильма этого жанра, в том числе нового, поэтому может жить
+        долго. В список без фильтра новый фильм войдёт незаметно для тегов.
+        """
+        return None if genre else settings.cache_list_max_expire
 
-    async def _put_film_to_cache(self, key: str, film: Film):  # TODO: update key
-        await self.cache.set(key, film.json(), FILM_CACHE_EXPIRE_IN_SECONDS)
+    @staticmethod
+    def film_tags(docs: list[dict] | None, genre: str = None) -> list[str]:
+        """Теги записи со списком фильмов: фильмы, их персоны и жанр фильтра.
 
-    async def _put_films_to_cache(self, key: str, films: List[Film]):  # TODO: update key
-        await self.cache.set(key, pickle.dumps(films), FILM_CACHE_EXPIRE_IN_SECONDS)
+        При проекции fields в документах есть только запрошенные поля,
+        поэтому персоны попадают в теги, только если были запрошены.
+        """
+        tags = {f'genre:{genre}'} if genre else set()
+        for doc in docs or ():
+            tags.add(f'film:{doc["id"]}')
+            for role in ('directors', 'writers', 'actors'):
+                tags.update(f'person:{person["id"]}' for person in doc.get(role) or ())
+        return list(tags)
 
-    def cache_key(self, key_base:str, *args):
+    @staticmethod
+    def cache_key(key_base:str, *args):
         res = key_base
         for arg in args:
             if arg is not None:
@@ -211,10 +298,11 @@ class FilmService:
 
 @lru_cache()
 def get_film_service(
-        cache: AsyncCache = Depends(get_redis),
+        cache: AsyncCache = Depends(get_cache),
         elastic: AsyncElasticsearch = Depends(get_elastic),
+        single_flight: SingleFlight = Depends(get_single_flight),
 ) -> FilmService:
-    return FilmService(elastic, cache)
+    return FilmService(elastic, cache, single_flight)
 
 class Pagination(BaseModel):
     page: int = 1
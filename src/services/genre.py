@@ -1,77 +1,63 @@
-import pickle
 from functools import lru_cache
 
 from db.elastic import get_elastic
-from db.redis import get_redis
 from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
 from models.movies import Genre
 from redis.asyncio import Redis
+from .base import BaseService
+from .cache import get_cache
 from .helper import AsyncCache
+from .single_flight import SingleFlight, get_single_flight
 
 GENRE_CACHE_EXPIRE_IN_SECONDS = 60 * 5
 
 
-class GenreService:
-    def __init__(self, elastic: AsyncElasticsearch, cache: AsyncCache):
-        self.cache = cache
-        self.elastic = elastic
-
+class GenreService(BaseService):
     async def get_by_id(self, genre_id: str) -> Genre | None:
         key = 'genre_id' + genre_id
-        genre = await self._genre_from_cache(key)
-        if not genre:
-            genre = await self._get_genre_from_elastic(genre_id)
-            if not genre:
-                return None
-            await self._put_genre_to_cache(key, genre)
-        return genre
+        doc = await self._cached(key,
+                                 lambda: self._get_genre_from_elastic(genre_id),
+                                 GENRE_CACHE_EXPIRE_IN_SECONDS)
+        if not doc:
+            return None
+        return Genre(**doc)
+
+    async def get_many(self, genre_ids: list[str]) -> list[Genre]:
+        docs = await self._cached_many(genre_ids,
+                                       lambda genre_id: 'genre_id' + genre_id,
+                                       lambda ids: self._mget_from_elastic('genres', ids),
+                                       GENRE_CACHE_EXPIRE_IN_SECONDS)
+        return [Genre(**doc) for doc in docs.values()]
 
-    async def _get_genre_from_elastic(self, genre_id: str) -> Genre | None:
+    async def _get_genre_from_elastic(self, genre_id: str) -> dict | None:
         try:
             doc = await self.elastic.get(index='genres', id=genre_id)
         except NotFoundError:
             return None
-        return Genre(**doc['_source'])
-
-    async def _genre_from_cache(self, key: str) -> Genre | None:
-        data = await self.cache.get(key)
-        if not data:
-            return None
+        return doc['_source']
 
-        return pickle.loads(data)
+    async def get_all_from_elastic(self) -> list[dict] | None:
+        return [doc async for doc in self._scan('genres')] or None
 
-    async def _put_genre_to_cache(self, key, genre: Genre):
-        await self.cache.set(str(key), pickle.dumps(genre), GENRE_CACHE_EXPIRE_IN_SECONDS)
-
-    async def get_all_from_elastic(self) -> list[Genre] | None:
-        try:
-            docs = await self.elastic.search(index='genres',
-                                             size='10000',
-                                             filter_path='hits.hits._source',
-                                             query={'match_all': {}}
-                                             )
-            if not docs:
-                return None
-            all_docs = [doc["_source"] for doc in docs["hits"]["hits"]]
-        except NotFoundError:
-            return None
-        return all_docs
+    async def get_all(self) -> list[dict] | None:
+        return await self._cached('all_genres', self.get_all_from_elastic, GENRE_CACHE_EXPIRE_IN_SECONDS)
 
-    async def get_all(self) -> list[Genre] | None:
-        genres = await self._genre_from_cache('all_genres')
-        if not genres:
-            genres = await self.get_all_from_elastic()
-            if not genres:
-                return None
-            await self._put_genre_to_cache('all_genres', genres)
+    @staticmethod
+    def invalidation_keys(genre_ids: list[str]) -> list[str]:
+        """Ключи кеша, устаревающие при изменении жанров."""
+        return ['genre_id' + genre_id for genre_id in genre_ids] + ['all_genres']
 
-        return genres
+    @staticmethod
+    def cache_patterns() -> list[str]:
+        """Шаблоны всех ключей кеша жанров: для сброса после переиндексации."""
+        return ['genre_id*', 'all_genres']
 
 
 @lru_cache()
 def get_genre_service(
-        cache: AsyncCache = Depends(get_redis),
+        cache: AsyncCache = Depends(get_cache),
         elastic: AsyncElasticsearch = Depends(get_elastic),
+        single_flight: SingleFlight = Depends(get_single_flight),
 ) -> GenreService:
-    return GenreService(elastic, cache)
+    return GenreService(elastic, cache, single_flight)
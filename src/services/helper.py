@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 
 class AsyncCache(ABC):
@@ -9,3 +11,42 @@ class AsyncCache(ABC):
     @abstractmethod
     async def set(self, key: str, value: str, expire: int, **kwargs):
         pass
+
+    @abstractmethod
+    async def get_many(self, keys: list[str], **kwargs) -> list:
+        pass
+
+    @abstractmethod
+    async def set_many(self, items: dict[str, str], expire: int, **kwargs):
+        pass
+
+    @abstractmethod
+    async def delete_many(self, keys: list[str], **kwargs):
+        pass
+
+    @abstractmethod
+    async def delete_matching(self, patterns: list[str], **kwargs) -> int:
+        pass
+
+    @abstractmethod
+    async def invalidate_tags(self, tags: list[str], **kwargs) -> int:
+        pass
+
+    @asynccontextmanager
+    async def pipelined(self) -> AsyncIterator[None]:
+        """Одновременные чтения внутри блока кеш может отправить одним запросом."""
+        yield
+
+    def expire_for(self, key: str, expire: int) -> int:
+        """Время жизни записи; кеш может менять его по частоте обращений."""
+        return expire
+
+    def refresh_due(self, key: str, remaining: float, expire: int) -> bool:
+        """Обновить ли свежую запись заранее, до истечения."""
+        return False
+
+    def hot_keys(self) -> list[tuple[str, int]]:
+        return []
+
+    def stats(self) -> dict:
+        return {}
@@ -0,0 +1,99 @@
+from array import array
+from hashlib import blake2b
+
+
+class HotKeys:
+    """Частота обращений к ключам кеша в памяти воркера.
+
+    Счётчики хранятся в count-min sketch фиксированного размера, поэтому
+    память не зависит от числа ключей; оценка может только завышать
+    частоту. После каждых window обращений все счётчики делятся пополам,
+    чтобы частота отражала недавние обращения, а не всю историю. Рядом
+    держатся top ключей с наибольшей оценкой.
+    """
+
+    def __init__(self,
+                 width: int,
+                 depth: int,
+                 window: int,
+                 threshold: int,
+                 hot_factor: float,
+                 cold_factor: float,
+                 refresh_ahead: float,
+                 top: int):
+        self.width = width
+        self.depth = depth
+        self.window = window
+        self.threshold = threshold
+        self.hot_factor = hot_factor
+        self.cold_factor = cold_factor
+        self.refresh_ahead = refresh_ahead
+        self.top = top
+        self._rows = [array('L', [0]) * width for _ in range(depth)]
+        self._accesses = 0
+        self._top: dict[str, int] = {}
+        self._top_min = 0
+
+    def _slots(self, key: str) -> list[int]:
+        digest = blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.width for i in range(self.depth)]
+
+    def record(self, key: str) -> int:
+        """Учесть обращение к ключу; возвращает новую оценку частоты."""
+        estimate = None
+        for row, slot in zip(self._rows, self._slots(key)):
+            row[slot] += 1
+            estimate = row[slot] if estimate is None else min(estimate, row[slot])
+        self._accesses += 1
+        if self._accesses >= self.window:
+            self._decay()
+        else:
+            self._update_top(key, estimate)
+        return estimate
+
+    def estimate(self, key: str, *related: str) -> int:
+        """Оценка частоты ключа; с related - наибольшая из оценок ключа и related."""
+        return max(min(row[slot] for row, slot in zip(self._rows, self._slots(k))) for k in (key, *related))
+
+    def _update_top(self, key: str, estimate: int):
+        if key in self._top or len(self._top) < self.top:
+            self._top[key] = estimate
+        elif estimate > self._top_min:
+            del self._top[min(self._top, key=self._top.get)]
+            self._top[key] = estimate
+        else:
+            return
+        if len(self._top) >= self.top:
+            self._top_min = min(self._top.values())
+
+    def _decay(self):
+        for row in self._rows:
+            for slot in range(self.width):
+                row[slot] >>= 1
+        self._accesses = 0
+        self._top = {key: estimate >> 1 for key, estimate in self._top.items() if estimate > 1}
+        self._top_min = min(self._top.values(), default=0)
+
+    def is_hot(self, key: str, *related: str) -> bool:
+        return self.estimate(key, *related) >= self.threshold
+
+    def expire_for(self, key: str, expire: int, *related: str) -> int:
+        """Время жизни записи с учётом частоты: дольше для горячих, короче для холодных.
+
+        related - ключи, через которые запись читается, например ответ ручки,
+        собранный из неё: пока он отдаётся из кеша, сама запись не читается,
+        но холоднее него не считается.
+        """
+        estimate = self.estimate(key, *related)
+        if estimate >= self.threshold:
+            return int(expire * self.hot_factor)
+        if estimate <= 1:
+            return max(1, int(expire * self.cold_factor))
+        return expire
+
+    def refresh_due(self, key: str, remaining: float, expire: int, *related: str) -> bool:
+        """Пора ли обновить свежую ещё запись заранее, чтобы горячий ключ не истёк."""
+        return remaining < expire * self.refresh_ahead and self.is_hot(key, *related)
+
+    def hot_keys(self) -> list[tuple[str, int]]:
+        return sorted(self._top.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Callable
+
+from fastapi import Depends
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.redis import get_redis
+from .cache import get_cache, response_cache_key, response_cache_pattern
+from .film import FilmService
+from .genre import GenreService
+from .helper import AsyncCache
+from .person import PersonService
+from .tags import data_key_tag
+from .warmup import CacheWarmer, get_warmer
+
+logger = logging.getLogger(__name__)
+
+# Индекс ElasticSearch -> ключи кеша сервиса и префикс ручки с документом по id
+INDEX_KEYS: dict[str, tuple[Callable[[list[str]], list[str]], str]] = {
+    'movies': (FilmService.invalidation_keys, '/api/v1/films/'),
+    'persons': (PersonService.invalidation_keys, '/api/v1/persons/'),
+    'genres': (GenreService.invalidation_keys, '/api/v1/genres/'),
+}
+# Индекс ElasticSearch -> шаблоны всех ключей кеша, собранных из него
+INDEX_PATTERNS: dict[str, list[str]] = {
+    'movies': FilmService.cache_patterns() + [response_cache_pattern('/api/v1/films/')],
+    'persons': PersonService.cache_patterns() + [response_cache_pattern('/api/v1/persons/')],
+    'genres': GenreService.cache_patterns() + [response_cache_pattern('/api/v1/genres/')],
+}
+# Индекс ElasticSearch -> теги списков и поисков, содержащих документ
+INDEX_TAGS: dict[str, Callable[[list[str]], list[str]]] = {
+    'movies': FilmService.invalidation_tags,
+    'persons': PersonService.invalidation_tags,
+}
+
+# Продвинуть общий курсор потока до ARGV[1], если он дальше текущего;
+# возвращает прежнее значение курсора
+_ADVANCE_SCRIPT = """
+local last = redis.call('GET', KEYS[1])
+if last then
+    local ms, seq = string.match(last, '(%d+)-(%d+)')
+    local new_ms, new_seq = string.match(ARGV[1], '(%d+)-(%d+)')
+    ms, seq, new_ms, new_seq = tonumber(ms), tonumber(seq), tonumber(new_ms), tonumber(new_seq)
+    if new_ms < ms or (new_ms == ms and new_seq <= seq) then
+        return last
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1])
+return last
+"""
+
+
+def stream_id(message_id: bytes | str | None) -> tuple[int, int]:
+    if not message_id:
+        return 0, 0
+    if isinstance(message_id, bytes):
+        message_id = message_id.decode()
+    ms, _, seq = message_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+class CacheInvalidator:
+    """Сброс кеша по id документов, которые ETL записал в ElasticSearch.
+
+    ETL пишет в поток Redis сообщения {index, ids, genres}, где genres -
+    жанры записанных фильмов. Каждый воркер читает
+    поток сам: локальный кеш у каждого свой, а удаление ключей в Redis
+    повторно безопасно.
+
+    Id последнего обработанного сообщения хранится в Redis (<stream>:last_id)
+    общим для всех воркеров. При старте воркер до прогрева перечитывает
+    только сообщения после него, но не старше cache_invalidation_replay
+    секунд: это изменения, пришедшие, пока API был остановлен. Локальный
+    кеш при старте пуст, поэтому пропущенное достаточно применить к Redis
+    один раз: воркер сначала продвигает курсор за пачку сообщений и
+    применяет только те, что были после прежнего значения, и одновременно
+    стартующие воркеры не сбрасывают кеш по одному сообщению повторно.
+
+    ids=* сбрасывает весь кеш индекса: так ETL сообщает о переключении
+    алиаса на заново загруженную версию.
+
+    Сообщение с index=warmup, которое ETL пишет после загрузки, запускает
+    прогрев кеша. Такие сообщения из перечитанного прошлого пропускаются:
+    при старте кеш и так прогревается.
+    """
+
+    def __init__(self, redis: Redis, cache: AsyncCache, stream: str, replay: int, warmer: CacheWarmer | None = None):
+        self.redis = redis
+        self.cache = cache
+        self.stream = stream
+        self.replay_window = replay
+        self.warmer = warmer
+        self.invalidated = 0
+        self.replayed = asyncio.Event()
+        self._cursor = f'{stream}:last_id'
+        self._advance = redis.register_script(_ADVANCE_SCRIPT)
+        self._started_ms = int(time.time() * 1000)
+
+    def keys_for(self, index: str, ids: list[str]) -> list[str]:
+        if index not in INDEX_KEYS:
+            return []
+        service_keys, path = INDEX_KEYS[index]
+        return service_keys(ids) + [response_cache_key(path + id_) for id_ in ids]
+
+    async def invalidate(self, index: str, ids: list[str], genres: list[str] = ()):
+        if ids == ['*']:
+            self.invalidated += await self.cache.delete_matching(INDEX_PATTERNS.get(index, []))
+            return
+        keys = self.keys_for(index, ids)
+        await self.cache.delete_many(keys)
+        self.invalidated += len(keys)
+        # Вместе с записями - ответы ручек, собранные из них, и списки с документами
+        tags = [data_key_tag(key) for key in keys]
+        if index in INDEX_TAGS:
+            tags += INDEX_TAGS[index](ids)
+        # Жанры изменённых фильмов: в списки этих жанров фильм мог войти впервые
+        tags += FilmService.genre_tags(genres)
+        self.invalidated += await self.cache.invalidate_tags(tags)
+
+    async def replay(self) -> bytes | str:
+        """Применить сообщения, пропущенные пока API был остановлен;
+        возвращает id последнего прочитанного сообщения."""
+        window = f'{int((time.time() - self.replay_window) * 1000)}-0'
+        cursor = await self.redis.get(self._cursor)
+        last_id = max(window, cursor or window, key=stream_id)
+        while True:
+            entries = await self.redis.xread({self.stream: last_id}, count=100)
+            messages = entries[0][1] if entries else []
+            if not messages:
+                return last_id
+            last_id = messages[-1][0]
+            previous = stream_id(await self._advance(keys=[self._cursor], args=[last_id]))
+            for message_id, fields in messages:
+                if stream_id(message_id) > previous:
+                    await self.apply(message_id, fields)
+
+    async def run(self):
+        try:
+            last_id = await self.replay()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('cache invalidation replay failed')
+            last_id = f'{int(time.time() * 1000)}-0'
+        finally:
+            self.replayed.set()
+        while True:
+            try:
+                entries = await self.redis.xread({self.stream: last_id}, count=100, block=5000)
+                for _, messages in entries:
+                    for message_id, fields in messages:
+                        await self.apply(message_id, fields)
+                        last_id = message_id
+                    await self._advance(keys=[self._cursor], args=[last_id])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('cache invalidation stream failed')
+                await asyncio.sleep(1)
+
+    async def apply(self, message_id: bytes, fields: dict[bytes, bytes]):
+        index = fields[b'index'].decode()
+        if index == 'warmup':
+            self._warmup(message_id)
+        else:
+            genres = fields.get(b'genres', b'').decode()
+            await self.invalidate(index, fields[b'ids'].decode().split(','), genres.split(',') if genres else [])
+
+    def _warmup(self, message_id: bytes):
+        if self.warmer is not None and int(message_id.split(b'-')[0]) >= self._started_ms:
+            self.warmer.start()
+
+    def stats(self) -> dict:
+        return {'invalidated_keys': self.invalidated}
+
+
+@lru_cache()
+def get_invalidator(redis: Redis = Depends(get_redis),
+                    cache: AsyncCache = Depends(get_cache),
+                    warmer: CacheWarmer = Depends(get_warmer)) -> CacheInvalidator:
+    return CacheInvalidator(redis, cache, settings.cache_invalidation_stream, settings.cache_invalidation_replay,
+                            warmer if settings.warmup_enabled else None)
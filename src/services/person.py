@@ -1,64 +1,52 @@
-import pickle
 from functools import lru_cache
 from pydantic import BaseModel
 
+from core.config import settings
 from db.elastic import get_elastic
-from db.redis import get_redis
 from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
 from models.movies import FilmsWithPerson, Person
 from redis.asyncio import Redis
+from .base import RELEVANCE_SORT, BaseService
+from .cache import get_cache
 from .helper import AsyncCache
+from .single_flight import SingleFlight, get_single_flight
 
 PERSON_CACHE_EXPIRE_IN_SECONDS = 60 * 5
 
 
-class PersonService:
-    def __init__(self, elastic: AsyncElasticsearch, cache: AsyncCache):
-        self.cache = cache
-        self.elastic = elastic
-
+class PersonService(BaseService):
     async def get_by_id(self, person_id: str) -> Person | None:
         key = 'person_id' + person_id
-        person = await self._person_from_cache(key)
-        if not person:
-            person = await self._get_person_from_elastic(person_id)
-            if not person:
-                return None
-            await self._put_person_to_cache(key, person)
-        return person
+        doc = await self._cached(key,
+                                 lambda: self._get_person_from_elastic(person_id),
+                                 PERSON_CACHE_EXPIRE_IN_SECONDS)
+        if not doc:
+            return None
+        return Person(**doc)
 
-    async def _get_person_from_elastic(self, person_id: str) -> Person | None:
+    async def get_many(self, person_ids: list[str]) -> list[Person]:
+        docs = await self._cached_many(person_ids,
+                                       lambda person_id: 'person_id' + person_id,
+                                       lambda ids: self._mget_from_elastic('persons', ids),
+                                       PERSON_CACHE_EXPIRE_IN_SECONDS)
+        return [Person(**doc) for doc in docs.values()]
+
+    async def _get_person_from_elastic(self, person_id: str) -> dict | None:
         try:
             doc = await self.elastic.get(index='persons', id=person_id)
         except NotFoundError:
             return None
-        return Person(**doc['_source'])
-
-    async def _person_from_cache(self, key: str) -> Person | list[Person] | None:
-        data = await self.cache.get(key)
-        if not data:
-            return None
-        return pickle.loads(data)
-
-    async def _put_person_to_cache(self, key, person: Person):
-        await self.cache.set(str(key), pickle.dumps(person), PERSON_CACHE_EXPIRE_IN_SECONDS)
+        return doc['_source']
 
-    async def _search_person_from_elastic(self, phrase: str, page: int, size: int) -> list[Person] | None:
+    async def _search_person_from_elastic(self, phrase: str, page: int, size: int) -> list[dict] | None:
         try:
             docs = await self.elastic.search(
                 index='persons',
                 filter_path='hits.hits._source',
                 size=size,
                 from_=(page-1)*size,
-                query={
-                    "match": {
-                        "full_name": {
-                            "query": phrase,
-                            "fuzziness": "auto"
-                             }
-                        }
-                    }
+                query=self._search_query(phrase)
             )
             if not docs:
                 return None
@@ -67,30 +55,70 @@ class PersonService:
             return None
         return all_docs
 
+    @staticmethod
+    def _search_query(phrase: str) -> dict:
+        return {
+            "match": {
+                "full_name": {
+                    "query": phrase,
+                    "fuzziness": "auto"
+                     }
+                }
+            }
+
     async def films_with_person(self, person_id: str) -> list[FilmsWithPerson] | None:
         person = await self.get_by_id(person_id)
         if person:
             return person.films
         return None
 
-    async def get_by_search(self, phrase: str, page: int, size: int) -> list[Person] | None:
+    async def get_by_search(self, phrase: str, page: int, size: int) -> list[dict] | None:
         key = 'persons_search' + phrase + str(page) + str(size)
-        persons = await self._person_from_cache(key)
-        if not persons:
-            persons = await self._search_person_from_elastic(phrase, page, size)
-            if not persons:
-                return None
-            await self._put_person_to_cache(key, persons)
-
-        return persons
+        return await self._cached(key,
+                                  lambda: self._search_person_from_elastic(phrase, page, size),
+                                  PERSON_CACHE_EXPIRE_IN_SECONDS,
+                                  self.person_tags,
+                                  settings.cache_list_max_expire)
+
+    async def get_by_search_after(self,
+                                  phrase: str,
+                                  size: int,
+                                  cursor: str | None = None,
+                                  consistent: bool = False) -> tuple[list[dict], str | None]:
+        key = 'persons_search_after' + phrase + str(size) + (cursor or '')
+        body = {'query': self._search_query(phrase), 'sort': RELEVANCE_SORT}
+        return await self._cached_search_after(key, 'persons', body, size, cursor, consistent,
+                                               PERSON_CACHE_EXPIRE_IN_SECONDS, self.person_tags,
+                                               settings.cache_list_max_expire)
+
+    @staticmethod
+    def invalidation_keys(person_ids: list[str]) -> list[str]:
+        """Ключи кеша, устаревающие при изменении персон."""
+        return ['person_id' + person_id for person_id in person_ids]
+
+    @staticmethod
+    def cache_patterns() -> list[str]:
+        """Шаблоны всех ключей кеша персон: для сброса после переиндексации."""
+        return ['person_id*', 'persons_search*']
+
+    @staticmethod
+    def invalidation_tags(person_ids: list[str]) -> list[str]:
+        """Теги списков фильмов и поисков персон, в которые попали персоны."""
+        return [f'person:{person_id}' for person_id in person_ids]
+
+    @staticmethod
+    def person_tags(docs: list[dict] | None) -> list[str]:
+        """Теги записи с поиском персон: персоны из выдачи."""
+        return [f'person:{doc["id"]}' for doc in docs or ()]
 
 
 @lru_cache()
 def get_person_service(
-        cache: AsyncCache = Depends(get_redis),
+        cache: AsyncCache = Depends(get_cache),
         elastic: AsyncElasticsearch = Depends(get_elastic),
+        single_flight: SingleFlight = Depends(get_single_flight),
 ) -> PersonService:
-    return PersonService(elastic, cache)
+    return PersonService(elastic, cache, single_flight)
 
 
 class Pagination(BaseModel):
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Any, Awaitable, Callable
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import LockError
+
+from core.config import settings
+from db.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Склеивает конкурентные промахи кеша по одному ключу в один запрос к бэкенду.
+
+    Внутри воркера ожидающие корутины получают результат лидера. Если передан
+    Redis, лидеры разных воркеров дополнительно сериализуются распределённой
+    блокировкой, а после её захвата значение сначала перепроверяется в кеше.
+    """
+
+    def __init__(self, redis: Redis | None = None, lock_timeout: float = 10, lock_wait: float = 5):
+        self.redis = redis
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.issued = 0
+        self.coalesced = 0
+        self.lock_timeouts = 0
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self,
+                 key: str,
+                 fn: Callable[[], Awaitable[Any]],
+                 recheck: Callable[[], Awaitable[Any]] | None = None) -> Any:
+        # Отмена одного из клиентов не должна отменять общий запрос
+        return await asyncio.shield(self.start(key, fn, recheck))
+
+    def start(self,
+              key: str,
+              fn: Callable[[], Awaitable[Any]],
+              recheck: Callable[[], Awaitable[Any]] | None = None) -> asyncio.Task:
+        """Вернуть общую задачу загрузки по ключу, запустив её при необходимости."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(self._call(key, fn, recheck))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+        return task
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _call(self, key: str, fn, recheck) -> Any:
+        if self.redis is None:
+            self.issued += 1
+            return await fn()
+
+        lock = self.redis.lock(f'lock:{key}', timeout=self.lock_timeout, blocking_timeout=self.lock_wait)
+        acquired = await lock.acquire()
+        if not acquired:
+            self.lock_timeouts += 1
+            logger.warning('single flight lock wait timed out for %s', key)
+        try:
+            if recheck is not None:
+                value = await recheck()
+                if value:
+                    self.coalesced += 1
+                    return value
+            self.issued += 1
+            return await fn()
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            'issued': self.issued,
+            'coalesced': self.coalesced,
+            'lock_timeouts': self.lock_timeouts,
+            'in_flight': len(self._calls),
+        }
+
+
+@lru_cache()
+def get_single_flight(redis: Redis = Depends(get_redis)) -> SingleFlight:
+    return SingleFlight(redis if settings.cache_lock_enabled else None,
+                        settings.cache_lock_timeout,
+                        settings.cache_lock_wait)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+TAG_PREFIX = 'tag:'
+
+# Удаление всех ключей из множеств тегов за один запрос. Сами множества
+# не удаляются: каждый воркер должен получить тот же список ключей, чтобы
+# сбросить свой локальный кеш. Мёртвые ключи из множеств убирает compact().
+_INVALIDATE_SCRIPT = """
+local keys = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call('SMEMBERS', tag)) do
+        keys[#keys + 1] = key
+    end
+end
+for i = 1, #keys, 1000 do
+    redis.call('DEL', unpack(keys, i, math.min(i + 999, #keys)))
+end
+return keys
+"""
+
+# Пачка членов множества тега через SSCAN: ключи, которых уже нет в Redis,
+# удаляются из множества в том же скрипте, поэтому запись, добавленная
+# между проверкой и удалением, из множества не пропадёт.
+# Возвращает {следующий курсор, число удалённых}
+_COMPACT_SCRIPT = """
+local scan = redis.call('SSCAN', KEYS[1], ARGV[1], 'COUNT', ARGV[2])
+local removed = 0
+for _, key in ipairs(scan[2]) do
+    if redis.call('EXISTS', key) == 0 then
+        removed = removed + redis.call('SREM', KEYS[1], key)
+    end
+end
+return {scan[1], removed}
+"""
+
+# Блокировка, под которой сжатие множеств тегов идёт только в одном воркере
+COMPACTION_LOCK = 'lock:tag_compaction'
+
+
+def tag_key(tag: str) -> str:
+    return TAG_PREFIX + tag
+
+
+def data_key_tag(key: str) -> str:
+    """Тег записей, собранных из записи кеша key, например ответов ручек."""
+    return 'key:' + key
+
+
+class TagIndex:
+    """Теги записей кеша: множество ключей Redis на каждый тег.
+
+    Запись списка или поиска фильмов регистрируется в тегах всех фильмов,
+    жанров и персон, которые в неё попали, поэтому при изменении документа
+    можно найти и удалить все такие записи, не перебирая ключи.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._invalidate = redis.register_script(_INVALIDATE_SCRIPT)
+        self._compact = redis.register_script(_COMPACT_SCRIPT)
+
+    @staticmethod
+    def register(pipe: Pipeline, key: str, tags: list[str], expire: int):
+        """Добавить ключ в теги в том же пайплайне, что и запись значения."""
+        for tag in set(tags):
+            pipe.sadd(tag_key(tag), key)
+            # Множество живёт не меньше самой долгой из его записей: срок только
+            # продлевается, а запись с коротким сроком его не сокращает
+            pipe.expire(tag_key(tag), expire, nx=True)
+            pipe.expire(tag_key(tag), expire, gt=True)
+
+    async def invalidate(self, tags: list[str]) -> list[str]:
+        """Удалить все записи с любым из тегов; возвращает удалённые ключи."""
+        if not tags:
+            return []
+        keys = await self._invalidate(keys=[tag_key(tag) for tag in set(tags)])
+        return list(dict.fromkeys(key.decode() if isinstance(key, bytes) else key for key in keys))
+
+    async def compact(self, batch_size: int) -> int:
+        """Убрать из множеств тегов ключи, которых уже нет в Redis."""
+        removed = 0
+        async for name in self.redis.scan_iter(match=TAG_PREFIX + '*', count=batch_size):
+            cursor = 0
+            while True:
+                cursor, count = await self._compact(keys=[name], args=[cursor, batch_size])
+                removed += count
+                if int(cursor) == 0:
+                    break
+        return removed
+
+    async def run_compaction(self, interval: int, batch_size: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Один проход за интервал на все воркеры: блокировка истекает сама
+                if not await self.redis.set(COMPACTION_LOCK, 1, nx=True, ex=interval):
+                    continue
+                removed = await self.compact(batch_size)
+                logger.info('cache tag compaction removed %s dangling keys', removed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('cache tag compaction failed')
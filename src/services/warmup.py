@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Awaitable
+
+from fastapi import Depends
+
+from core.config import settings
+from .film import FilmService, get_film_service
+from .genre import GenreService, get_genre_service
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """Прогрев кеша самыми частыми запросами.
+
+    Сначала загружаются все жанры и топ фильмов по рейтингу, затем
+    параллельно, не больше concurrency запросов к ElasticSearch сразу,
+    карточки фильмов из топа и первые страницы каждого жанра. Запросы идут
+    через обычные методы сервисов, поэтому попадают в те же ключи кеша,
+    что и запросы пользователей.
+    """
+
+    def __init__(self, film_service: FilmService, genre_service: GenreService, concurrency: int):
+        self.film_service = film_service
+        self.genre_service = genre_service
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.warmed = 0
+        self.failed = 0
+        self.last_duration: float | None = None
+
+    def start(self) -> asyncio.Task:
+        """Запустить прогрев в фоне; если он уже идёт, вернуть текущий."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.warm())
+        return self._task
+
+    async def warm(self):
+        started = time.monotonic()
+        try:
+            if settings.redis_pipeline_reads:
+                # Одновременные чтения прогрева уходят в Redis общими пайплайнами
+                async with self.film_service.cache.pipelined():
+                    await self._warm()
+            else:
+                await self._warm()
+        except Exception:
+            logger.exception('cache warm-up failed')
+        self.runs += 1
+        self.last_duration = time.monotonic() - started
+        logger.info('cache warm-up finished in %.2fs: %s keys, %s failed',
+                    self.last_duration, self.warmed, self.failed)
+
+    async def _warm(self):
+        genres, top = await asyncio.gather(
+            self._fetch(self.genre_service.get_all()),
+            self._fetch(self.film_service.get(genre=None, title=None, page=1, size=settings.warmup_top_films,
+                                              sort='-imdb_rating')),
+        )
+        jobs = []
+        if top:
+            jobs.append(self._fetch(self.film_service.get_many([str(film.uuid) for film in top])))
+        if settings.warmup_genre_pages:
+            jobs += [self._fetch(self.film_service.get(genre=genre['name'], title=None, page=1,
+                                                       size=settings.warmup_page_size))
+                     for genre in genres or ()]
+        if settings.warmup_all_films:
+            jobs.append(self._fetch(self.film_service.get_all()))
+        await asyncio.gather(*jobs)
+
+    async def _fetch(self, request: Awaitable):
+        async with self._semaphore:
+            try:
+                result = await request
+            except Exception:
+                self.failed += 1
+                logger.exception('cache warm-up request failed')
+                return None
+        self.warmed += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'runs': self.runs,
+            'running': self._task is not None and not self._task.done(),
+            'warmed': self.warmed,
+            'failed': self.failed,
+            'last_duration': self.last_duration,
+        }
+
+
+@lru_cache()
+def get_warmer(film_service: FilmService = Depends(get_film_service),
+               genre_service: GenreService = Depends(get_genre_service)) -> CacheWarmer:
+    return CacheWarmer(film_service, genre_service, settings.warmup_concurrency)
@@ -82,6 +82,17 @@ def get_list_data_from_api(http_session):
     return inner
 
 
+@pytest.fixture
+def post_data_to_api(http_session):
+    async def inner(url: str, data):
+        async with http_session.post(url, json=data) as response:
+            body = await response.json()
+            headers = response.headers
+            status = response.status
+        return body, headers, status
+    return inner
+
+
 @pytest.fixture()
 async def redis_client():
     redis_client = Redis(host=test_settings.REDIS_HOST, port=test_settings.REDIS_PORT)
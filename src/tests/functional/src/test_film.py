@@ -1,3 +1,4 @@
+import asyncio
 import json
 import time
 import uuid
@@ -53,8 +54,46 @@ async def test_films_search_query_sort(http_session, es_write_data, get_list_dat
     
     assert status == HTTPStatus.OK
     assert len(res) == len(test_films_search_data)
-    res[0]['imdb_rating'] == 9.0
-    res[1]['imdb_rating'] == 6.5
+    assert res[0]['imdb_rating'] == 9.0
+    assert res[1]['imdb_rating'] == 6.5
+
+@pytest.mark.asyncio
+async def test_films_search_query_sort_across_pages(http_session, es_write_data, get_list_data_from_api, test_films_search_data):
+    await es_write_data(test_films_search_data, es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?sort=imdb_rating&page=3&size=1'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.OK
+    assert res[0]['imdb_rating'] == 9.0
+
+@pytest.mark.asyncio
+async def test_films_search_query_sort_unknown_field(http_session, get_list_data_from_api):
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?sort=description'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+@pytest.mark.asyncio
+async def test_films_search_query_fields(http_session, es_write_data, get_list_data_from_api, test_films_search_data):
+    await es_write_data(test_films_search_data, es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?sort=-imdb_rating&fields=title,imdb_rating&page=1&size=50'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.OK
+    assert len(res) == len(test_films_search_data)
+    assert set(res[0]) == {'id', 'title', 'imdb_rating'}
+    assert res[0]['title'] == 'wow movie'
+
+@pytest.mark.asyncio
+async def test_films_search_query_fields_unknown(http_session, get_list_data_from_api):
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?fields=title,budget'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
 
 @pytest.mark.asyncio
 async def test_films_search_query_genre(http_session, es_write_data, get_list_data_from_api, test_films_search_data):
@@ -87,4 +126,125 @@ async def test_films_search_title(http_session, es_write_data, get_list_data_fro
     res, headers, status = await get_list_data_from_api(url)
 
     assert status == HTTPStatus.OK
-    assert len(res) == 2
\ No newline at end of file
+    assert len(res) == 2
+
+@pytest.mark.asyncio
+async def test_films_batch(http_session, es_write_data, post_data_to_api, test_films_search_data):
+    await es_write_data(test_films_search_data, es_index)
+    film_ids = [film['id'] for film in test_films_search_data[:2]] + [str(uuid.uuid4())]
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/batch'
+    res, headers, status = await post_data_to_api(url, film_ids)
+
+    assert status == HTTPStatus.OK
+    assert [film['id'] for film in res] == film_ids[:2]
+
+@pytest.mark.asyncio
+async def test_films_cursor_pagination(http_session, es_write_data, get_list_data_from_api, test_films_search_data):
+    await es_write_data(test_films_search_data, es_index)
+    base_url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+               f'/api/v1/films/?sort=-imdb_rating&size=2&cursor='
+    res, headers, status = await get_list_data_from_api(base_url)
+
+    assert status == HTTPStatus.OK
+    assert len(res['items']) == 2
+    assert res['next_cursor']
+
+    res, headers, status = await get_list_data_from_api(base_url + res['next_cursor'])
+
+    assert status == HTTPStatus.OK
+    assert len(res['items']) == 1
+    assert res['next_cursor'] is None
+
+@pytest.mark.asyncio
+async def test_films_export(http_session, es_write_data, test_films_search_data):
+    await es_write_data(test_films_search_data, es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/export'
+    async with http_session.get(url) as response:
+        status = response.status
+        lines = (await response.text()).splitlines()
+
+    assert status == HTTPStatus.OK
+    assert {json.loads(line)['id'] for line in lines} == {film['id'] for film in test_films_search_data}
+
+@pytest.mark.asyncio
+async def test_films_response_cache(http_session, es_write_data, get_list_data_from_api, redis_client):
+    token = uuid.uuid4().hex
+    await es_write_data([{'id': str(uuid.uuid4()), 'title': token, 'description': '',
+                          'imdb_rating': 7.0, 'genres': []}], es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?query={token}&page=1&size=50'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.OK
+    assert headers['X-Cache'] == 'MISS'
+
+    cached, headers, status = await get_list_data_from_api(url)
+
+    assert status == HTTPStatus.OK
+    assert headers['X-Cache'] == 'HIT'
+    assert cached == res
+
+@pytest.mark.asyncio
+async def test_films_consistent_cursor_not_cached(http_session, es_write_data, get_list_data_from_api,
+                                                 test_films_search_data, redis_client):
+    await es_write_data(test_films_search_data, es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?sort=-imdb_rating&size=2&consistent=true&cursor='
+    for _ in range(2):
+        res, headers, status = await get_list_data_from_api(url)
+
+        assert status == HTTPStatus.OK
+        assert headers['Cache-Control'] == 'no-store'
+        assert headers['X-Cache'] == 'MISS'
+
+@pytest.mark.asyncio
+async def test_films_response_cache_invalidated(http_session, es_write_data, get_list_data_from_api, redis_client):
+    token = uuid.uuid4().hex
+    film = {'id': str(uuid.uuid4()), 'title': token, 'description': '', 'imdb_rating': 7.0, 'genres': []}
+    await es_write_data([film], es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?query={token}&page=1&size=50'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert headers['X-Cache'] == 'MISS'
+
+    await es_write_data([dict(film, title=f'{token} updated')], es_index)
+    await redis_client.xadd('cache:invalidate', {'index': es_index, 'ids': film['id']})
+    # Сообщение о сбросе воркеры API читают из потока асинхронно
+    for _ in range(50):
+        res, headers, status = await get_list_data_from_api(url)
+        if headers['X-Cache'] == 'MISS':
+            break
+        await asyncio.sleep(0.1)
+
+    assert status == HTTPStatus.OK
+    assert headers['X-Cache'] == 'MISS'
+    assert res[0]['title'] == f'{token} updated'
+
+@pytest.mark.asyncio
+async def test_films_genre_page_invalidated_by_new_film(http_session, es_write_data, get_list_data_from_api,
+                                                        redis_client):
+    genre = uuid.uuid4().hex
+    films = [{'id': str(uuid.uuid4()), 'title': f'film {i}', 'description': '', 'imdb_rating': 7.0, 'genres': [genre]}
+             for i in range(2)]
+    await es_write_data(films[:1], es_index)
+    url = f'http://{test_settings.FASTAPI_HOST}:{test_settings.FASTAPI_PORT}' \
+          f'/api/v1/films/?genre={genre}&page=1&size=50'
+    res, headers, status = await get_list_data_from_api(url)
+
+    assert headers['X-Cache'] == 'MISS'
+    assert len(res) == 1
+
+    await es_write_data(films[1:], es_index)
+    await redis_client.xadd('cache:invalidate', {'index': es_index, 'ids': films[1]['id'], 'genres': genre})
+    for _ in range(50):
+        res, headers, status = await get_list_data_from_api(url)
+        if headers['X-Cache'] == 'MISS':
+            break
+        await asyncio.sleep(0.1)
+
+    assert status == HTTPStatus.OK
+    assert headers['X-Cache'] == 'MISS'
+    assert len(res) == 2
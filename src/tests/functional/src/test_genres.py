@@ -60,3 +60,14 @@ async def test_get_by_id_from_cache(redis_client, es_write_data, get_data_from_a
     assert status == HTTPStatus.OK
     assert body['id'] == data[0]['id']
     assert body['name'] == data[0]['name']
+
+
+@pytest.mark.asyncio
+async def test_batch(es_write_data, post_data_to_api):
+    await es_write_data(data, ES_INDEX)
+
+    genre_ids = [genre['id'] for genre in data[:3]]
+    body, headers, status = await post_data_to_api(base_url + 'batch', genre_ids)
+
+    assert status == HTTPStatus.OK
+    assert [genre['id'] for genre in body] == genre_ids
@@ -106,3 +106,14 @@ async def test_films_by_person(es_write_data, get_data_from_api, es_delete_data)
 
     assert status == HTTPStatus.OK
     assert len(body["items"]) == len(data[0]['films'])
+
+
+@pytest.mark.asyncio
+async def test_batch(es_write_data, post_data_to_api):
+    await es_write_data(data, ES_INDEX)
+
+    person_ids = [person['id'] for person in data[:3]]
+    body, headers, status = await post_data_to_api(base_url + 'batch', person_ids)
+
+    assert status == HTTPStatus.OK
+    assert [person['uuid'] for person in body] == person_ids